@@ -3,6 +3,9 @@ from mcd_task.global_variables import GlobalVariables
 from mcd_task.task_manager import *
 from mcd_task.constants import PLAYER_RENAMED, DATA_FOLDER
 from mcd_task.config import Config
+from mcd_task.persistence import PersistenceWorker
+from mcd_task.scheduler import DeadlineScheduler
+from mcd_task.render_pool import RenderPool
 
 from parse import parse
 
@@ -34,24 +37,50 @@ def on_info(server: PluginServerInterface, info: Info):
 
 
 def on_player_joined(server: PluginServerInterface, player: str, info: Info):
-    player_tasks = []
-    now_time = float(time.time())
-    for t in GlobalVariables.task_manager.responsible_manager[player]:  # type: Task
-        task = GlobalVariables.task_manager[t.titles]
-        if not task.is_done and now_time > task.deadline != 0:
-            player_tasks.append(task)
+    GlobalVariables.scheduler.online_players.add(player)
+    player_tasks = GlobalVariables.scheduler.overdue_tasks(player)
     if len(player_tasks) > 0:
         task_timed_out(server, player, player_tasks)
 
 
+def on_player_left(server: PluginServerInterface, player: str):
+    GlobalVariables.scheduler.online_players.discard(player)
+
+
+def on_server_stop(server: PluginServerInterface, server_return_code: int):
+    GlobalVariables.scheduler.online_players.clear()
+
+
 def on_load(server: PluginServerInterface, prev_module):
+    online_players = set()
     if prev_module is not None:
-        pass
+        # MCDR keeps no player list, so players online before the reload are taken from the previous instance
+        prev_scheduler = getattr(getattr(prev_module, 'GlobalVariables', None), 'scheduler', None)
+        if prev_scheduler is not None:
+            online_players = prev_scheduler.online_players
     GlobalVariables.set_config(Config.load(server))
+    # Language files are reloaded along with the plugin
+    GlobalVariables.help_cache.clear()
     GlobalVariables.setup_task_manager(TaskManager.load())
+    GlobalVariables.setup_persistence(PersistenceWorker(GlobalVariables.config.save_debounce))
+    GlobalVariables.persistence.start()
+    GlobalVariables.setup_scheduler(DeadlineScheduler(online_players))
+    GlobalVariables.scheduler.start()
+    config = GlobalVariables.config
+    GlobalVariables.setup_render_pool(
+        RenderPool(config.render_workers, config.max_concurrent_renders, config.render_timeout)
+    )
     register_cmd_tree(server)
     server.register_help_message(PREFIX, server.tr("mcd_task.mcdr_help"))
 
 
 def on_unload(*args, **kwargs):
+    if GlobalVariables.render_pool is not None:
+        GlobalVariables.render_pool.stop()
+    if GlobalVariables.scheduler is not None:
+        GlobalVariables.scheduler.stop()
+    if GlobalVariables.persistence is not None:
+        GlobalVariables.persistence.stop()
+    if GlobalVariables.task_manager is not None:
+        GlobalVariables.task_manager.storage.close()
     GlobalVariables.logger.unset_file()
@@ -1,15 +1,23 @@
+import collections
+import functools
+import itertools
+import os
+import shlex
 import time
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Dict, Tuple, Iterable, Callable
 
 from mcdreforged.api.all import *
 
 from mcd_task.global_variables import GlobalVariables
-from mcd_task.constants import PREFIX, DEBUG_MODE
-from mcd_task.exceptions import TaskNotFound
-from mcd_task.task_manager import Task
+from mcd_task.constants import PREFIX, DEBUG_MODE, DATA_FOLDER
+from mcd_task.exceptions import TaskNotFound, IllegalBatchOperation
+from mcd_task.task_manager import Task, BatchOperation
+from mcd_task.task_query import TaskQuery
+from mcd_task.render_pool import render_reply
 from mcd_task.utils import formatted_time, source_name, TitleList
 from mcd_task.rtext_components import tr, info_elements, title_text, info_responsibles, add_task_button, \
-    EditButtonType, info_sub_tasks, sub_task_title_text
+    EditButtonType, info_sub_tasks, preferred_language, freeze, TitleRow, render_row, sub_task_title_rows, \
+    page_navigation, snapshot_rows, TaskSnapshot
 
 
 # ===============================
@@ -17,6 +25,16 @@ from mcd_task.rtext_components import tr, info_elements, title_text, info_respon
 # ===============================
 
 
+class TaskArgument(QuotableText):
+    """
+    Task path argument resolved once parsed, its value is the task or None if there is no such task
+    Actions and renders take the task as it is instead of resolving the path again
+    """
+    def parse(self, text: str) -> ParseResult:
+        result = super().parse(text)
+        return ParseResult(GlobalVariables.task_manager.find(TitleList(result.value)), result.char_read)
+
+
 def register_cmd_tree(server: PluginServerInterface):
     def permed_literal(*literal: str) -> Literal:
         lvl = GlobalVariables.config.get_permission(literal[0])
@@ -27,8 +45,8 @@ def register_cmd_tree(server: PluginServerInterface):
         )
 
     def ensure_task_exist_quotable_text(title: str = 'title'):
-        return QuotableText(title).requires(
-            lambda src, ctx: GlobalVariables.task_manager.exists(TitleList(ctx[title])),
+        return TaskArgument(title).requires(
+            lambda src, ctx: ctx[title] is not None,
             lambda: tr("mcd_task.task_not_found").h(
                 tr("mcd_task.task_not_found_hover", PREFIX)).c(
                 RAction.run_command, f'{PREFIX} list').set_color(
@@ -53,12 +71,16 @@ def register_cmd_tree(server: PluginServerInterface):
     root_node = Literal(PREFIX).runs(lambda src: root_func(src))
     nodes = [
         permed_literal('overview').runs(lambda src: task_overview(src)),
-        permed_literal('list').runs(lambda src: list_task(src)),
+        permed_literal('list').runs(lambda src: list_task(src)).then(
+            Integer('page').at_min(1).runs(lambda src, ctx: list_task(src, ctx['page']))
+        ),
         permed_literal('help').runs(lambda src: show_help(src)),
         permed_literal('detail').then(
-            ensure_task_exist_quotable_text().runs(lambda src, ctx: info_task(src, title=ctx['title']))
+            ensure_task_exist_quotable_text().runs(lambda src, ctx: info_task(src, ctx['title']))
+        ),
+        permed_literal('list-all').runs(lambda src: all_tasks_detail(src)).then(
+            Integer('page').at_min(1).runs(lambda src, ctx: all_tasks_detail(src, ctx['page']))
         ),
-        permed_literal('list-all').runs(lambda src: all_tasks_detail(src)),
         permed_literal('add').then(
             ensure_task_not_exist_quotable_text().runs(lambda src, ctx: add_task(src, ctx['title'])).then(
                 GreedyText('description').runs(lambda src, ctx: add_task(src, ctx['title'], ctx['description']))
@@ -68,8 +90,8 @@ def register_cmd_tree(server: PluginServerInterface):
             ensure_task_exist_quotable_text().runs(lambda src, ctx: remove_task(src, ctx['title']))
         ),
         permed_literal('rename').then(
-            ensure_task_exist_quotable_text('old_titles').then(
-                QuotableText('new_title').runs(lambda src, ctx: rename_task(src, ctx['old_titles'], ctx['new_title']))
+            ensure_task_exist_quotable_text('task').then(
+                QuotableText('new_title').runs(lambda src, ctx: rename_task(src, ctx['task'], ctx['new_title']))
             )
         ),
         permed_literal('change').then(
@@ -91,7 +113,9 @@ def register_cmd_tree(server: PluginServerInterface):
             )
         ),
         permed_literal('player').then(
-            QuotableText('name').runs(lambda src, ctx: info_player(src, ctx['name']))
+            QuotableText('name').runs(lambda src, ctx: info_player(src, ctx['name'])).then(
+                Integer('page').at_min(1).runs(lambda src, ctx: info_player(src, ctx['name'], ctx['page']))
+            )
         ),
         permed_literal("responsible", "res").then(
             ensure_task_exist_quotable_text().runs(lambda src, ctx: set_responsible(src, ctx['title'])).then(
@@ -112,6 +136,31 @@ def register_cmd_tree(server: PluginServerInterface):
                 Integer('priority').runs(lambda src, ctx: set_task_priority(src, ctx['title'], ctx['priority']))
             )
         ),
+        permed_literal('batch').then(
+            Literal('-file').then(
+                QuotableText('file').runs(lambda src, ctx: batch_from_file(src, ctx['file']))
+            )
+        ).then(
+            GreedyText('operations').runs(lambda src, ctx: batch_tasks(src, ctx['operations'].split(';')))
+        ),
+        permed_literal('search').then(
+            Literal('-page').then(
+                Integer('page').at_min(1).then(
+                    GreedyText('terms').runs(lambda src, ctx: search_tasks(src, ctx['terms'], ctx['page']))
+                )
+            )
+        ).then(
+            GreedyText('terms').runs(lambda src, ctx: search_tasks(src, ctx['terms']))
+        ),
+        permed_literal('query').then(
+            Literal('-page').then(
+                Integer('page').at_min(1).then(
+                    GreedyText('conditions').runs(lambda src, ctx: query_tasks(src, ctx['conditions'], ctx['page']))
+                )
+            )
+        ).then(
+            GreedyText('conditions').runs(lambda src, ctx: query_tasks(src, ctx['conditions']))
+        ),
         permed_literal('reload').runs(lambda src: reload_self(src))
     ]
     for node in nodes:
@@ -127,6 +176,50 @@ def register_cmd_tree(server: PluginServerInterface):
 list_cmd = f"{PREFIX} list"
 
 
+def reading_tasks(func):
+    """
+    Run the action holding the read lock of the task manager, no mutation happens while it renders
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with GlobalVariables.task_manager.lock.read():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def rendering_off_thread(func: Callable[..., RTextBase]):
+    """
+    Reply the text the action renders, the action runs on the render pool in the preferred language of the source
+    and returns before the reply is sent. It should snapshot the tasks under the read lock and render without it
+    """
+    @functools.wraps(func)
+    def wrapper(source: CommandSource, *args, **kwargs):
+        def render() -> RTextBase:
+            return func(source, *args, **kwargs)
+        if GlobalVariables.render_pool is None:
+            source.reply(render_reply(source, render))
+        else:
+            GlobalVariables.render_pool.submit(source, render)
+    return wrapper
+
+
+def writing_tasks(func):
+    """
+    Run the action holding the write lock of the task manager, so that its reply shows its own mutation
+    """
+    @functools.wraps(func)
+    def wrapper(source: CommandSource, *args, **kwargs):
+        with GlobalVariables.task_manager.lock.write():
+            try:
+                return func(source, *args, **kwargs)
+            except TaskNotFound:
+                # Deleted by others after the command was parsed
+                task_not_found(source)
+                if DEBUG_MODE:
+                    raise
+    return wrapper
+
+
 # Errors
 def cmd_error(source: CommandSource, exception: CommandError):
     if isinstance(exception, RequirementNotMet):
@@ -156,20 +249,57 @@ def illegal_call(source: CommandSource):
 
 
 # Info
-def info_player(source: CommandSource, name: str) -> None:
-    tasks = list(GlobalVariables.task_manager.responsible_manager[name])
-    text = [
-        tr("player_tasks_title", name, str(len(tasks))).set_color(RColor.green).set_styles(RStyle.bold),
-    ]
-    for task in tasks:
-        text.append(title_text(task, display_full_path=True, display_not_empty_mark=True))
-    source.reply(RText.join('\n', text))
-
-
-def info_task(source: CommandSource, title: str, headline_override: Union[None, str, RTextBase] = None) -> None:
-    # Get task instance
+def page_slice(items: Iterable, page: int) -> Tuple[list, bool]:
+    """
+    Items on the page and if there are more after it, items before the page are skipped
+    """
+    size = max(GlobalVariables.config.page_size, 1)
+    items = list(itertools.islice(items, (page - 1) * size, page * size + 1))
+    return items[:size], len(items) > size
+
+
+def render_page(headline: RTextBase, rows: Iterable[TitleRow], page: int,
+                cmd: Union[str, Callable[[int], str]], has_next: Optional[bool] = None) -> RTextBase:
+    """
+    Render the rows on the page only, rows before it are skipped without rendering
+    Rows are taken as the ones on the page already if has_next is given
+    """
+    if has_next is None:
+        rows, has_next = page_slice(rows, page)
+    text = [headline] + [render_row(row) for row in rows]
+    if page > 1 or has_next:
+        text.append(page_navigation(cmd, page, has_next))
+    return RTextBase.join('\n', text)
+
+
+def snapshot_page(rows: Iterable[TitleRow], page: int) -> Tuple[List[TitleRow], bool]:
+    """
+    Rows on the page with their tasks snapshotted, and if there are more after it
+    """
+    with GlobalVariables.task_manager.lock.read():
+        rows, has_next = page_slice(rows, page)
+        return snapshot_rows(rows), has_next
+
+
+@rendering_off_thread
+def info_player(source: CommandSource, name: str, page: int = 1) -> RTextBase:
+    responsible_manager = GlobalVariables.task_manager.responsible_manager
+    with responsible_manager.lock.read():
+        num = len(responsible_manager.player_work.get(name, []))
+        # Assignments are a set, sorted so that pages stay the same between calls
+        rows, has_next = snapshot_page((
+            TitleRow(0, task, dict(display_full_path=True, display_not_empty_mark=True))
+            for task in sorted(responsible_manager[name], key=lambda task: str(task.titles))
+        ), page)
+    headline = tr("player_tasks_title", name, str(num)).set_color(RColor.green).set_styles(RStyle.bold)
+    return render_page(headline, rows, page, f'{PREFIX} player {name}', has_next)
+
+
+@reading_tasks
+def info_task(source: CommandSource, task: Task, headline_override: Union[None, str, RTextBase] = None) -> None:
+    # Check the task resolved before is still there
     try:
-        target_task = GlobalVariables.task_manager[title]
+        target_task = GlobalVariables.task_manager.resolve(task)
     except TaskNotFound:
         task_not_found(source)
         if DEBUG_MODE:
@@ -183,58 +313,125 @@ def info_task(source: CommandSource, title: str, headline_override: Union[None,
     if isinstance(headline_override, RTextBase):
         headline = headline_override
     headline.set_color(RColor.green).set_styles(RStyle.bold)
-    task_title_text = title_text(target_task, display_full_path=True, with_edit_button=True)
-    info_desc = info_elements(target_task)
-    info_ddl = info_elements(target_task, EditButtonType.deadline)
-    info_priority = info_elements(target_task, EditButtonType.priority)
-    info_res = info_responsibles(target_task)
-    info_sub = info_sub_tasks(target_task)
+    with preferred_language(source):
+        task_title_text = title_text(target_task, display_full_path=True, with_edit_button=True)
+        info_desc = info_elements(target_task)
+        info_ddl = info_elements(target_task, EditButtonType.deadline)
+        info_priority = info_elements(target_task, EditButtonType.priority)
+        info_res = info_responsibles(target_task)
+        info_sub = info_sub_tasks(target_task)
 
     # Show task text
     source.reply(RText.join('\n', [headline, task_title_text, info_desc, info_ddl, info_priority, info_res, info_sub]))
 
 
+@rendering_off_thread
+def search_tasks(source: CommandSource, terms: str, page: int = 1) -> RTextBase:
+    manager = GlobalVariables.task_manager
+    with manager.lock.read():
+        task_ids = manager.search_task_ids(terms)
+        # Only the tasks on the page are materialized
+        page_ids, has_next = page_slice(task_ids, page)
+        tasks = manager.seek_for_ids(page_ids)
+        rows = snapshot_rows(
+            TitleRow(0, tasks[task_id], dict(display_full_path=True, display_not_empty_mark=True))
+            for task_id in page_ids if task_id in tasks.keys()
+        )
+    if len(task_ids) == 0:
+        return tr('search_no_result', terms).set_color(RColor.yellow)
+    headline = tr('search_result_title', len(task_ids), terms).set_color(RColor.green).set_styles(RStyle.bold)
+    return render_page(headline, rows, page, lambda num: f'{PREFIX} search -page {num} {terms}', has_next)
+
+
+@rendering_off_thread
+def query_tasks(source: CommandSource, conditions: str, page: int = 1) -> RTextBase:
+    try:
+        query = TaskQuery.parse(shlex.split(conditions))
+    except ValueError as exc:
+        return tr('query_illegal', str(exc)).set_color(RColor.red)
+    manager = GlobalVariables.task_manager
+    with manager.lock.read():
+        tasks = manager.query_tasks(query)
+        rows, has_next = snapshot_page(
+            (TitleRow(0, task, dict(display_full_path=True, display_not_empty_mark=True)) for task in tasks), page
+        )
+    if len(tasks) == 0:
+        return tr('query_no_result', conditions).set_color(RColor.yellow)
+    headline = tr('query_result_title', len(tasks), conditions).set_color(RColor.green).set_styles(RStyle.bold)
+    return render_page(headline, rows, page, lambda num: f'{PREFIX} query -page {num} {conditions}', has_next)
+
+
 # Others
-def list_task(source: CommandSource):
+@rendering_off_thread
+def list_task(source: CommandSource, page: int = 1) -> RTextBase:
     headline = tr('list_task_title').set_styles(RStyle.bold).set_color(
         RColor.green) + ' ' + add_task_button()
-    task_list_text = []
-    for task in GlobalVariables.task_manager.sorted_sub_tasks:
-        task_list_text.append(title_text(task, display_not_empty_mark=True))
-    task_list_text = RTextBase.join('\n', task_list_text)
-    text = [headline, task_list_text]
-    source.reply(RText.join('\n', text))
+    manager = GlobalVariables.task_manager
+    with manager.lock.read():
+        rows, has_next = snapshot_page(
+            (TitleRow(0, task, dict(display_not_empty_mark=True)) for task in manager.sorted_sub_tasks), page
+        )
+    return render_page(headline, rows, page, list_cmd, has_next)
 
 
-def set_task_deadline(source: CommandSource, titles: str, ddl: str) -> None:
+@writing_tasks
+def set_task_deadline(source: CommandSource, task: Task, ddl: str) -> None:
     deadline = float(time.time()) + float(ddl) * 3600 * 24
-    GlobalVariables.task_manager.set_deadline(TitleList(titles), deadline)
-    info_task(source, titles, headline_override=tr("ddl_set"))
+    GlobalVariables.task_manager.set_deadline(task, deadline)
+    info_task(source, task, headline_override=tr("ddl_set"))
     GlobalVariables.log(
-        f"{source_name(source)} set task {titles} deadline to {formatted_time(deadline, locale='en_us')}"
+        f"{source_name(source)} set task {task.titles} deadline to {formatted_time(deadline, locale='en_us')}"
     )
 
 
-def clear_task_deadline(source: CommandSource, titles: str):
-    GlobalVariables.task_manager.set_deadline(TitleList(titles), 0)
-    info_task(source, titles, headline_override=tr('ddl_cleared'))
+@writing_tasks
+def clear_task_deadline(source: CommandSource, task: Task):
+    GlobalVariables.task_manager.set_deadline(task, 0)
+    info_task(source, task, headline_override=tr('ddl_cleared'))
     GlobalVariables.log(
-        f"{source_name(source)} removed task {titles} deadline"
+        f"{source_name(source)} removed task {task.titles} deadline"
     )
 
 
-def task_overview(source: CommandSource):
-    GlobalVariables.debug('Running overview...')
-    headline = tr('overview_headline').set_styles(RStyle.bold).set_color(RColor.green) + ' ' + add_task_button()
+# Rendered overview of each language: language -> (task manager version, expiry time, text)
+overview_cache = {}  # type: Dict[str, Tuple[int, Optional[float], RTextBase]]
 
-    # Get task instances
-    deadline_approaching = GlobalVariables.task_manager.seek_for_item_with_deadline_approaching()
-    GlobalVariables.debug(deadline_approaching)
+
+@rendering_off_thread
+def task_overview(source: CommandSource) -> RTextBase:
+    manager, language = GlobalVariables.task_manager, source.get_preference().language
+    with manager.lock.read():
+        cached = overview_cache.get(language)
+        if cached is not None:
+            version, expiry, text = cached
+            if version == manager.version and (expiry is None or time.time() < expiry):
+                return text
+        version, expiry = manager.version, manager.next_deadline_warning()
+        deadline_approaching, with_priorities = overview_tasks()
+    # Translate once, replies of this language then send the cached text as it is
+    text = freeze(render_overview(deadline_approaching, with_priorities))
+    overview_cache[language] = version, expiry, text
+    return text
+
+
+def overview_tasks() -> Tuple[List[TaskSnapshot], List[TaskSnapshot]]:
+    """
+    Snapshots of the tasks with deadline approaching and of the prioritized ones, taken under the read lock
+    """
     max_length = GlobalVariables.config.overview_maximum_task_amount
+    deadline_approaching = GlobalVariables.task_manager.seek_for_item_with_deadline_approaching(max_length)
+    GlobalVariables.debug(deadline_approaching)
     priority_amount = max_length - len(deadline_approaching)
     with_priorities = []
     if priority_amount > 0:
-        with_priorities = GlobalVariables.task_manager.seek_for_item_with_priority()
+        # Some of them could be listed as deadline approaching already
+        with_priorities = GlobalVariables.task_manager.seek_for_item_with_priority(max_length)
+    return list(map(TaskSnapshot.take, deadline_approaching)), list(map(TaskSnapshot.take, with_priorities))
+
+
+def render_overview(deadline_approaching: List[TaskSnapshot], with_priorities: List[TaskSnapshot]) -> RTextBase:
+    GlobalVariables.debug('Running overview...')
+    headline = tr('overview_headline').set_styles(RStyle.bold).set_color(RColor.green) + ' ' + add_task_button()
 
     # Found no matched task handle
     if len(deadline_approaching) == 0 and len(with_priorities) == 0:
@@ -251,7 +448,7 @@ def task_overview(source: CommandSource):
         for task in with_priorities:
             if len(task_texts) >= GlobalVariables.config.overview_maximum_task_amount:
                 break
-            if task.title not in task_texts.keys():
+            if task.titles not in task_texts.keys():
                 task_texts[task.titles] = RText('[!] ', RColor.gold).h(
                     tr('has_a_high_priority', task.priority)
                 ) + title_text(task, display_full_path=True)
@@ -259,13 +456,14 @@ def task_overview(source: CommandSource):
 
     help_message = tr('overview_help', PREFIX).set_translator(GlobalVariables.htr)
 
-    source.reply(RTextBase.join('\n', [headline, task_text, help_message]))
+    return RTextBase.join('\n', [headline, task_text, help_message])
 
 
-def set_task_priority(source: CommandSource, titles: str, priority: Optional[int] = None):
-    GlobalVariables.task_manager.set_priority(TitleList(titles), priority)
-    info_task(source, titles, headline_override=tr('priority_set'))
-    GlobalVariables.log(f"{source_name(source)} set task {titles} priority to {priority}")
+@writing_tasks
+def set_task_priority(source: CommandSource, task: Task, priority: Optional[int] = None):
+    GlobalVariables.task_manager.set_priority(task, priority)
+    info_task(source, task, headline_override=tr('priority_set'))
+    GlobalVariables.log(f"{source_name(source)} set task {task.titles} priority to {priority}")
 
 
 def reload_self(source: CommandSource):
@@ -282,62 +480,74 @@ def show_help(source: CommandSource):
     source.reply(tr('help_msg', pre=PREFIX, name=meta.name, ver=ver).set_translator(GlobalVariables.htr))
 
 
+@writing_tasks
 def add_task(source: CommandSource, titles: str, desc: str = ''):
     titles = TitleList(titles)
-    titles_for_text = titles.copy()
-
     GlobalVariables.task_manager.add_task(titles, desc=desc)
-    info_task(source, title=str(titles_for_text), headline_override=tr("new_task_created"))
-    GlobalVariables.log(f"{source_name(source)} created new task named {str(titles_for_text)}")
+    info_task(source, GlobalVariables.task_manager[titles], headline_override=tr("new_task_created"))
+    GlobalVariables.log(f"{source_name(source)} created new task named {str(titles)}")
 
 
-def all_tasks_detail(source: CommandSource):
-    task_details = [tr("detailed_info_task_title").set_color(RColor.green).set_styles(RStyle.bold) + ' ' +
-                    add_task_button()]
-    for task in GlobalVariables.task_manager.sorted_sub_tasks:
-        task_details.append(title_text(task, include_sub=False, display_not_empty_mark=True))
-        if len(task.sub_tasks) > 0:
-            task_details.append(sub_task_title_text(task, indent=8))
-    source.reply(RTextBase.join('\n', task_details))
+@rendering_off_thread
+def all_tasks_detail(source: CommandSource, page: int = 1) -> RTextBase:
+    headline = tr("detailed_info_task_title").set_color(RColor.green).set_styles(RStyle.bold) + ' ' + \
+        add_task_button()
 
+    def rows():
+        for task in GlobalVariables.task_manager.sorted_sub_tasks:
+            yield TitleRow(0, task, dict(include_sub=False, display_not_empty_mark=True))
+            if task.has_sub_tasks:
+                yield from sub_task_title_rows(task, indent=8)
+    rows, has_next = snapshot_page(rows(), page)
+    return render_page(headline, rows, page, f'{PREFIX} list-all', has_next)
 
-def remove_task(source: CommandSource, titles: str):
-    GlobalVariables.task_manager.delete_task(TitleList(titles))
+
+@writing_tasks
+def remove_task(source: CommandSource, task: Task):
+    titles = task.titles
+    GlobalVariables.task_manager.delete_task(task)
     source.reply(tr("mcd_task.deleted_task", "§e{}§r".format(titles)))
     GlobalVariables.log(f"{source_name(source)} deleted task {titles}")
 
 
-def rename_task(source: CommandSource, old_titles: str, new_title: str) -> None:
+@writing_tasks
+def rename_task(source: CommandSource, task: Task, new_title: str) -> None:
     if '.' in list(new_title):
         source.reply(tr("mcd_task.illegal_title_with_dot", new_title))
         return
-    GlobalVariables.task_manager.rename_task(TitleList(old_titles), new_title)
-    new_titles = TitleList(old_titles)
-    new_titles.pop_tail()
-    new_titles.append(new_title)
-    info_task(source, title=str(new_titles), headline_override=tr("mcd_task.task_renamed", old_titles))
-    GlobalVariables.log(f"{source_name(source)} renamed {old_titles} to {str(new_titles)}")
+    old_titles = task.titles
+    new_titles = old_titles.parent.child(new_title)
+    if new_titles != old_titles and GlobalVariables.task_manager.exists(new_titles):
+        task_already_exist(source)
+        return
+    GlobalVariables.task_manager.rename_task(task, new_title)
+    info_task(source, task, headline_override=tr("mcd_task.task_renamed", str(old_titles)))
+    GlobalVariables.log(f"{source_name(source)} renamed {old_titles} to {new_titles}")
 
 
-def edit_desc(source: CommandSource, titles: str, desc: str) -> None:
-    GlobalVariables.task_manager.edit_desc(TitleList(titles), desc)
-    info_task(source, title=titles, headline_override='changed_desc_title')
-    GlobalVariables.log(f"{source_name(source)} changed task {titles} description to {desc}")
+@writing_tasks
+def edit_desc(source: CommandSource, task: Task, desc: str) -> None:
+    GlobalVariables.task_manager.edit_desc(task, desc)
+    info_task(source, task, headline_override='changed_desc_title')
+    GlobalVariables.log(f"{source_name(source)} changed task {task.titles} description to {desc}")
 
 
-def set_done(source: CommandSource, titles: str) -> None:
-    GlobalVariables.task_manager.done_task(TitleList(titles))
-    info_task(source, title=titles, headline_override='done_task_title')
-    GlobalVariables.log(f"{source_name(source)} marked task {titles} as done")
+@writing_tasks
+def set_done(source: CommandSource, task: Task) -> None:
+    GlobalVariables.task_manager.done_task(task)
+    info_task(source, task, headline_override='done_task_title')
+    GlobalVariables.log(f"{source_name(source)} marked task {task.titles} as done")
 
 
-def set_undone(source: CommandSource, titles: str) -> None:
-    GlobalVariables.task_manager.undone_task(TitleList(titles))
-    info_task(source, title=titles, headline_override='undone_task_title')
-    GlobalVariables.log(f"{source_name(source)} marked task {titles} as undone")
+@writing_tasks
+def set_undone(source: CommandSource, task: Task) -> None:
+    GlobalVariables.task_manager.undone_task(task)
+    info_task(source, task, headline_override='undone_task_title')
+    GlobalVariables.log(f"{source_name(source)} marked task {task.titles} as undone")
 
 
-def set_responsible(source: CommandSource, titles: str, players: Optional[str] = None) -> None:
+@writing_tasks
+def set_responsible(source: CommandSource, task: Task, players: Optional[str] = None) -> None:
     if players is None:
         if isinstance(source, PlayerCommandSource):
             players = source.player
@@ -345,12 +555,13 @@ def set_responsible(source: CommandSource, titles: str, players: Optional[str] =
             illegal_call(source)
             return
     players = players.split(' ')
-    num = GlobalVariables.task_manager.set_responsible(TitleList(titles), *players)
-    info_task(source, titles, headline_override=tr("mcd_task.added_responsibles_title", num))
-    GlobalVariables.log(f"{source_name(source)} added responsibles for task {str(titles)}: {str(players)}")
+    num = GlobalVariables.task_manager.set_responsible(task, *players)
+    info_task(source, task, headline_override=tr("mcd_task.added_responsibles_title", num))
+    GlobalVariables.log(f"{source_name(source)} added responsibles for task {task.titles}: {str(players)}")
 
 
-def rm_responsible(source: CommandSource, titles: str, players: Optional[str] = None) -> None:
+@writing_tasks
+def rm_responsible(source: CommandSource, task: Task, players: Optional[str] = None) -> None:
     if players is None:
         if isinstance(source, PlayerCommandSource):
             players = source.player
@@ -358,29 +569,117 @@ def rm_responsible(source: CommandSource, titles: str, players: Optional[str] =
             illegal_call(source)
             return
     players = players.split(' ')
-    removed = GlobalVariables.task_manager.rm_responsible(TitleList(titles), *players)
+    removed = GlobalVariables.task_manager.rm_responsible(task, *players)
     num = len(removed)
-    info_task(source, titles, headline_override=tr("mcd_task.removed_responsibles_title", num))
-    GlobalVariables.log(f"{source_name(source)} removed responsibles for task {str(titles)}: {str(players)}")
+    info_task(source, task, headline_override=tr("mcd_task.removed_responsibles_title", num))
+    GlobalVariables.log(f"{source_name(source)} removed responsibles for task {task.titles}: {str(players)}")
+
+
+@writing_tasks
+def rm_all_responsible(source: CommandSource, task: Task):
+    players = GlobalVariables.task_manager.resolve(task).responsibles
+    rm_responsible(source, task, players=' '.join(players))
+
+
+# Command aliases accepted in batches -> the command name permissions are configured with
+BATCH_COMMAND_ALIASES = {
+    'rm': 'remove', 'delete': 'remove', 'del': 'remove', 'res': 'responsible', 'unres': 'unresponsible'
+}
+# Batch command -> (TaskManager method, least argument amount after the task, most amount or None for no limit)
+BATCH_COMMANDS = {
+    'add': ('add_task', 0, None),
+    'remove': ('delete_task', 0, 0),
+    'rename': ('rename_task', 1, 1),
+    'change': ('edit_desc', 0, None),
+    'done': ('done_task', 0, 0),
+    'undone': ('undone_task', 0, 0),
+    'deadline': ('set_deadline', 1, 1),
+    'priority': ('set_priority', 1, 1),
+    'responsible': ('set_responsible', 1, None),
+    'unresponsible': ('rm_responsible', 1, None)
+}  # type: Dict[str, Tuple[str, int, Optional[int]]]
+
+
+def parse_batch_line(line: str) -> Tuple[Optional[str], Optional[BatchOperation]]:
+    """
+    One operation written like the command without prefix, e.g. "deadline witch_farm.floor 3"
+    Returns the command name and the operation, both None for blank lines and comments, raises ValueError
+    """
+    words = shlex.split(line, comments=True)
+    if len(words) == 0:
+        return None, None
+    cmd = BATCH_COMMAND_ALIASES.get(words[0], words[0])
+    if cmd not in BATCH_COMMANDS.keys():
+        raise ValueError(f'Unknown command: {words[0]}')
+    op, least, most = BATCH_COMMANDS[cmd]
+    args = words[2:]
+    if len(words) < 2 or len(args) < least or (most is not None and len(args) > most):
+        raise ValueError(f'Wrong arguments of command {words[0]}')
+    if cmd in ['add', 'change']:
+        args = [' '.join(args)]
+    elif cmd == 'deadline':
+        args = [0 if args[0] == 'clear' else float(time.time()) + float(args[0]) * 3600 * 24]
+    elif cmd == 'priority':
+        args = [None if args[0] == 'clear' else int(args[0])]
+    return cmd, BatchOperation(op, TitleList(words[1]), tuple(args))
+
+
+@writing_tasks
+def batch_tasks(source: CommandSource, lines: List[str]) -> None:
+    commands, operations, line_numbers = [], [], []
+    for num, line in enumerate(lines, start=1):
+        try:
+            cmd, operation = parse_batch_line(line)
+        except ValueError as exc:
+            source.reply(tr('batch_illegal_line', num, str(exc)).set_color(RColor.red))
+            return
+        if operation is None:
+            continue
+        lvl = GlobalVariables.config.get_permission(cmd)
+        lvl = lvl if isinstance(lvl, int) else 0
+        if not source.has_permission(lvl):
+            source.reply(tr('batch_illegal_line', num, tr('perm_denied', lvl)).set_color(RColor.red))
+            return
+        commands.append(cmd)
+        operations.append(operation)
+        line_numbers.append(num)
+    try:
+        GlobalVariables.task_manager.apply_batch(operations)
+    except IllegalBatchOperation as exc:
+        source.reply(tr('batch_illegal_line', line_numbers[exc.index], str(exc.reason)).set_color(RColor.red))
+        return
+    summary = ', '.join(f'{cmd}: {num}' for cmd, num in collections.Counter(commands).items())
+    source.reply(tr('batch_applied', len(operations), summary))
+    GlobalVariables.log(f"{source_name(source)} applied a batch of {len(operations)} operation(s): {summary}")
 
 
-def rm_all_responsible(source: CommandSource, titles: str):
-    players = GlobalVariables.task_manager.responsible_manager.get_responsibles(titles)
-    rm_responsible(source, titles, players=' '.join(players))
+def batch_from_file(source: CommandSource, file_name: str) -> None:
+    folder = os.path.realpath(DATA_FOLDER)
+    path = os.path.realpath(os.path.join(folder, file_name))
+    # Only files in the data folder could be read
+    if os.path.commonpath([folder, path]) != folder or not os.path.isfile(path):
+        source.reply(tr('batch_file_not_found', file_name).set_color(RColor.red))
+        return
+    with open(path, 'r', encoding='UTF-8') as f:
+        lines = f.read().splitlines()
+    batch_tasks(source, lines)
 
 
+@writing_tasks
 def inherit_responsible(info: Info, old_name: str, new_name: str, debug=False):
     manager = GlobalVariables.task_manager.responsible_manager
     if old_name in manager.player_work.keys():
         manager.rename_player(old_name, new_name)
-        num = len(manager[new_name])
+        num = len(manager.player_work[new_name])
         info.get_server().tell(new_name, tr("mcd_task.on_player_renamed", num))
         GlobalVariables.logger.debug(tr("mcd_task.on_player_renamed", num), no_check=debug)
         GlobalVariables.log(f"Detected player rename {old_name} -> {new_name}. Inherited {num} task(s)")
 
 
-def task_timed_out(server: PluginServerInterface, player: str, player_tasks: List[Task]):
-    text = [tr("on_player_joined", len(player_tasks)).set_color(RColor.red).set_styles(RStyle.bold)]
+@reading_tasks
+def task_timed_out(server: PluginServerInterface, player: str, player_tasks: List[Task],
+                   tr_key: str = 'on_player_joined'):
+    text = [tr(tr_key, len(player_tasks)).set_color(RColor.red).set_styles(RStyle.bold)]
     for t in player_tasks:
         text.append(title_text(t, display_full_path=True, display_not_empty_mark=True))
     server.tell(player, RTextBase.join('\n', text))
@@ -11,6 +11,8 @@ class Config(Serializable):
         "list": 0,
         "detail": 0,
         "list-all": 0,
+        "search": 0,
+        "query": 0,
         "list-done": 0,
         "player": 2,
         "responsible": 2,
@@ -20,6 +22,15 @@ class Config(Serializable):
     default_overview_instead_of_list: bool = True
     overview_deadline_warning_threshold: int = 1  # days
     overview_maximum_task_amount: int = 10
+    page_size: int = 20  # rows
+    storage_backend: str = 'json'  # json or sqlite
+    journal_enabled: bool = True
+    journal_compact_threshold: int = 1048576  # bytes
+    save_debounce: float = 1.0  # seconds
+    render_workers: int = 2
+    max_concurrent_renders: int = 4  # renders running or queued
+    render_timeout: float = 10.0  # seconds
+    render_cache_size: int = 4096  # cached components
 
     @classmethod
     def load(cls, server: PluginServerInterface):
@@ -16,10 +16,14 @@ if not os.path.isdir(DATA_FOLDER):
 CONFIG_PATH = os.path.join(DATA_FOLDER, "config.json")
 # Task file path
 TASK_PATH = os.path.join(DATA_FOLDER, "mc_task.json")
+# Task mutation journal path
+TASK_JOURNAL_PATH = os.path.join(DATA_FOLDER, "mc_task.journal")
 # Task path for old version of this plugin
 TASK_PATH_PREV = "./plugins/task/mc_task.json"
 # Responsible Group file path
 RESG_PATH = os.path.join(DATA_FOLDER, "responsible.json")
+# SQLite database path, used when storage backend is sqlite
+DATABASE_PATH = os.path.join(DATA_FOLDER, "task.db")
 # Log file path
 LOG_PATH = os.path.join(DATA_FOLDER, "logs", "task.log")
 
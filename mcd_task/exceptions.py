@@ -20,3 +20,15 @@ class DuplicatedTask(Exception):
 class IllegalTaskName(Exception):
     def __init__(self, titles):
         self.titles = str(titles)
+
+    def __str__(self):
+        return f"Illegal task name: {self.titles}"
+
+
+class IllegalBatchOperation(Exception):
+    def __init__(self, index: int, reason: Exception) -> None:
+        self.index = index
+        self.reason = reason
+
+    def __str__(self):
+        return f"Operation #{self.index + 1}: {self.reason}"
@@ -2,8 +2,8 @@ import logging
 import os.path
 import re
 import types
-from typing import Optional, Union, TYPE_CHECKING
-from mcdreforged.api.all import RTextBase, RTextList, RText, RAction, ServerInterface, MCDReforgedLogger
+from typing import Optional, Union, Dict, Tuple, Any, TYPE_CHECKING
+from mcdreforged.api.all import RTextBase, RText, RAction, ServerInterface, MCDReforgedLogger
 
 from mcd_task.config import Config
 from mcd_task.constants import LOG_PATH, PREFIX, DEBUG_MODE, DATA_FOLDER
@@ -11,6 +11,13 @@ from mcd_task.constants import LOG_PATH, PREFIX, DEBUG_MODE, DATA_FOLDER
 
 if TYPE_CHECKING:
     from mcd_task.task_manager import TaskManager
+    from mcd_task.persistence import PersistenceWorker
+    from mcd_task.scheduler import DeadlineScheduler
+    from mcd_task.render_pool import RenderPool
+
+
+# Commands to be filled when a help line is clicked
+HELP_COMMAND_PATTERN = re.compile(r'(?<=§7){}[\S ]*?(?=§)'.format(re.escape(PREFIX)))
 
 
 def inject_set_file_method(logger: MCDReforgedLogger):
@@ -20,12 +27,17 @@ def inject_set_file_method(logger: MCDReforgedLogger):
 
 class GlobalVariables:
     task_manager: Optional["TaskManager"] = None
+    persistence: Optional["PersistenceWorker"] = None
+    scheduler: Optional["DeadlineScheduler"] = None
+    render_pool: Optional["RenderPool"] = None
     server = ServerInterface.get_instance()
     logger = None
     if server is not None:
         server = server.as_plugin_server_interface()
         logger = inject_set_file_method(server.logger)
     config = None
+    # Built help texts: (key, args, kwargs, language) -> text
+    help_cache = {}  # type: Dict[Tuple[Any, ...], RTextBase]
 
     @classmethod
     def log(cls, msg):
@@ -43,21 +55,26 @@ class GlobalVariables:
 
     @classmethod
     def htr(cls, key: str, *args, language=None, **kwargs) -> Union[str, RTextBase]:
-        help_message, help_msg_rtext = cls.server.tr(key, *args, language=language, **kwargs), RTextList()
+        cache_key = (key, args, tuple(sorted(kwargs.items())), language)
+        cached = cls.help_cache.get(cache_key)
+        if cached is not None:
+            # Translators could apply styles to the returned text
+            return cached.copy()
+        help_message, help_msg_rtext = cls.server.tr(key, *args, language=language, **kwargs), []
         if not isinstance(help_message, str):
             cls.logger.error('Error translate text "{}"'.format(key))
             return key
         for line in help_message.splitlines():
-            result = re.search(r'(?<=§7){}[\S ]*?(?=§)'.format(PREFIX), line)
+            result = HELP_COMMAND_PATTERN.search(line)
             if result is not None:
                 cmd = result.group().strip() + ' '
                 help_msg_rtext.append(RText(line).c(RAction.suggest_command, cmd).h(
                     cls.tr("mcd_task.help_msg_suggest_hover", cmd.strip())))
             else:
                 help_msg_rtext.append(line)
-            if line != help_message.splitlines()[-1]:
-                help_msg_rtext.append('\n')
-        return help_msg_rtext
+        help_msg_rtext = RTextBase.join('\n', help_msg_rtext)
+        cls.help_cache[cache_key] = help_msg_rtext
+        return help_msg_rtext.copy()
 
     @classmethod
     def set_config(cls, cfg: 'Config'):
@@ -66,3 +83,22 @@ class GlobalVariables:
     @classmethod
     def setup_task_manager(cls, task_manager: 'TaskManager'):
         cls.task_manager = task_manager
+
+    @classmethod
+    def setup_persistence(cls, persistence: 'PersistenceWorker'):
+        cls.persistence = persistence
+
+    @classmethod
+    def setup_scheduler(cls, scheduler: 'DeadlineScheduler'):
+        cls.scheduler = scheduler
+
+    @classmethod
+    def setup_render_pool(cls, render_pool: 'RenderPool'):
+        cls.render_pool = render_pool
+
+    @classmethod
+    def schedule_save(cls, store):
+        if cls.persistence is not None and cls.persistence.is_alive():
+            cls.persistence.mark_dirty(store)
+        else:
+            store.flush()
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Iterator, Dict, List
+
+from mcd_task.constants import TASK_JOURNAL_PATH
+from mcd_task.global_variables import GlobalVariables
+from mcd_task.utils import atomic_write
+
+
+# Seq at the head of a record cut off in the middle
+TORN_SEQ_PATTERN = re.compile(r'^\{"seq":(\d+)[,}]')
+
+
+class TaskJournal:
+    """
+    Append-only log of task tree mutations, replayed on top of the last snapshot of mc_task.json
+    Each line is a compact json record: {"seq": <int>, "op": <TaskManager method>, "titles": <str>, "args": [...]}
+    """
+    def __init__(self, path: str = TASK_JOURNAL_PATH):
+        self.path = path
+        self.seq = 0
+        self.size = os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+        self.__pending = []  # type: List[str]
+        self.__lock = threading.Lock()
+        self.__file_lock = threading.Lock()
+
+    def append(self, op: str, titles: str, *args: Any) -> int:
+        with self.__lock:
+            self.seq += 1
+            seq = self.seq
+            line = json.dumps(
+                dict(seq=seq, op=op, titles=titles, args=args), ensure_ascii=False, separators=(',', ':')
+            ) + '\n'
+            self.__pending.append(line)
+            self.size += len(line.encode('utf8'))
+        GlobalVariables.schedule_save(self)
+        return seq
+
+    def flush(self) -> None:
+        with self.__file_lock:
+            with self.__lock:
+                lines, self.__pending = self.__pending, []
+            if len(lines) > 0:
+                with open(self.path, 'a', encoding='utf8') as fp:
+                    fp.writelines(lines)
+
+    def read(self, after: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Records after the given seq, the file is cut back to the last good record once they are all read
+        so that records appended later won't be stuck behind a torn one
+        """
+        if not os.path.isfile(self.path):
+            return
+        good_size, torn, line = 0, False, b''
+        with open(self.path, 'rb') as fp:
+            for line in fp:
+                if line.strip() == b'':
+                    good_size += len(line)
+                    continue
+                try:
+                    record = json.loads(line.decode('utf8'))
+                except ValueError:
+                    # A torn write can only happen to the last record, its seq is skipped rather than reused
+                    broken = line.decode('utf8', 'replace').strip()
+                    GlobalVariables.logger.warning(f'Dropped broken journal record: {broken}')
+                    matched = TORN_SEQ_PATTERN.match(broken)
+                    if matched is not None:
+                        self.seq = max(self.seq, int(matched.group(1)))
+                    torn = True
+                    break
+                good_size += len(line)
+                self.seq = max(self.seq, record['seq'])
+                if record['seq'] > after:
+                    yield record
+        if torn:
+            self.__repair(good_size, newline=False)
+        elif line != b'' and not line.endswith(b'\n'):
+            self.__repair(good_size, newline=True)
+
+    def __repair(self, good_size: int, newline: bool) -> None:
+        """
+        Drop everything after the last good record, or terminate it if its line break is missing
+        """
+        with self.__file_lock:
+            with open(self.path, 'r+b') as fp:
+                fp.truncate(good_size)
+                if newline:
+                    fp.seek(good_size)
+                    fp.write(b'\n')
+            with self.__lock:
+                self.size = os.path.getsize(self.path) + sum(len(line.encode('utf8')) for line in self.__pending)
+
+    def truncate(self, up_to: int) -> None:
+        """
+        Drop records already included in the snapshot, keeps the ones appended after it was taken
+        """
+        with self.__file_lock:
+            remaining = []
+            for line in self.__read_lines():
+                try:
+                    if json.loads(line)['seq'] > up_to:
+                        remaining.append(line)
+                except json.JSONDecodeError:
+                    break
+            atomic_write(self.path, ''.join(remaining))
+            with self.__lock:
+                self.__pending = [line for line in self.__pending if json.loads(line)['seq'] > up_to]
+                self.size = sum(len(line.encode('utf8')) for line in remaining + self.__pending)
+
+    def __read_lines(self):
+        if not os.path.isfile(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf8') as fp:
+            return [line for line in fp if line.strip() != '']
@@ -0,0 +1,52 @@
+import threading
+from typing import Dict, Any
+
+from mcd_task.global_variables import GlobalVariables
+
+
+class PersistenceWorker(threading.Thread):
+    """
+    Background thread flushing dirty stores to disk
+    Stores marked dirty within one debounce window are flushed together, each store should provide a flush() method
+    """
+    def __init__(self, debounce: float):
+        super().__init__(name='TaskPersistence', daemon=True)
+        self.debounce = debounce
+        self.__dirty = {}  # type: Dict[int, Any]
+        self.__lock = threading.Lock()
+        self.__flush_lock = threading.Lock()
+        self.__dirty_event = threading.Event()
+        self.__stopped = threading.Event()
+
+    def mark_dirty(self, store) -> None:
+        with self.__lock:
+            self.__dirty[id(store)] = store
+            self.__dirty_event.set()
+
+    def run(self) -> None:
+        while not self.__stopped.is_set():
+            self.__dirty_event.wait()
+            # Collect other saves happened in this window, return immediately when stopping
+            self.__stopped.wait(self.debounce)
+            self.flush()
+
+    def flush(self) -> None:
+        with self.__flush_lock:
+            with self.__lock:
+                stores = list(self.__dirty.values())
+                self.__dirty.clear()
+                self.__dirty_event.clear()
+            for store in stores:
+                try:
+                    store.flush()
+                except Exception:
+                    GlobalVariables.logger.exception(f'Failed to save {type(store).__name__}, retrying in next window')
+                    self.mark_dirty(store)
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        self.__dirty_event.set()
+        if self.is_alive():
+            self.join()
+        # Final flush, retried stores included
+        self.flush()
@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from mcdreforged.api.all import RColor, RTextBase
+from mcdreforged.api.types import CommandSource
+
+from mcd_task.global_variables import GlobalVariables
+from mcd_task.rtext_components import tr, preferred_language
+
+
+class RenderPool:
+    """
+    Worker threads rendering replies of heavy read commands, so that MCDR's task executor goes on meanwhile
+    At most max_renders renders run or queue at once and more requests are refused,
+    renders not done within timeout seconds reply a timeout notice instead, since threads can't be cancelled
+    """
+    def __init__(self, workers: int, max_renders: int, timeout: float):
+        self.timeout = timeout
+        self.__executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='TaskRender')
+        self.__slots = threading.BoundedSemaphore(max(max_renders, 1))
+
+    def submit(self, source: CommandSource, render: Callable[[], RTextBase]) -> None:
+        if not self.__slots.acquire(blocking=False):
+            source.reply(tr('render_busy').set_color(RColor.red))
+            return
+        deadline = time.time() + self.timeout
+        try:
+            self.__executor.submit(self.__run, source, render, deadline)
+        except RuntimeError:
+            # Shut down already
+            self.__slots.release()
+
+    def __run(self, source: CommandSource, render: Callable[[], RTextBase], deadline: float) -> None:
+        try:
+            # Rendering is skipped if it has waited in the queue for too long, and dropped if it finished too late
+            text = render_reply(source, render) if time.time() < deadline else None
+            if text is None or time.time() >= deadline:
+                text = tr('render_timed_out').set_color(RColor.red)
+            source.reply(text)
+        except Exception:
+            GlobalVariables.logger.exception('Failed to render command reply')
+        finally:
+            self.__slots.release()
+
+    def stop(self) -> None:
+        self.__executor.shutdown(wait=True)
+
+
+def render_reply(source: CommandSource, render: Callable[[], RTextBase]) -> RTextBase:
+    """
+    Render in the preferred language of the source
+    Renders take the read lock themselves only to snapshot the tasks, so that writers don't wait for the rendering
+    """
+    with preferred_language(source):
+        return render()
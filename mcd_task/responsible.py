@@ -1,105 +1,141 @@
-import json
-import os
-from typing import Dict, Set, Union, TYPE_CHECKING, Iterator
+from typing import Dict, List, Set, Tuple, Union, TYPE_CHECKING
 
-from parse import parse
-
-from mcd_task.constants import RESG_PATH
+from mcd_task.global_variables import GlobalVariables
 from mcd_task.utils import TitleList
 from mcd_task.exceptions import DuplicatedTask, TaskNotFound
+from mcd_task.rw_lock import RWLock, read_locked, write_locked
 
 
 if TYPE_CHECKING:
-    from mcd_task.task_manager import TaskManager, Task
+    from mcd_task.task_manager import TaskManager, TaskBase, Task
 
 
 class ResponsibleManager:
+    """
+    Assignments reference task ids, so renaming or moving tasks never touches them
+    Shares the lock of the task manager
+    """
     def __init__(self, task_manager: "TaskManager"):
-        self.path = RESG_PATH   # type: str
-        self.player_work = {}   # type: Dict[str, Set[str]]
+        self.player_work = {}   # type: Dict[str, Set[int]]
+        # Reverse of player_work: task id -> players
+        self.task_players = {}  # type: Dict[int, Set[str]]
+        # Assignments linked (True) or unlinked (False) since the last save, for storages saving them one by one
+        self.__changes = []  # type: List[Tuple[str, int, bool]]
         self.task_manager = task_manager
 
+    @property
+    def lock(self) -> RWLock:
+        return self.task_manager.lock
+
+    def __link(self, player: str, task_id: int) -> None:
+        self.player_work.setdefault(player, set()).add(task_id)
+        self.task_players.setdefault(task_id, set()).add(player)
+        self.__changes.append((player, task_id, True))
+
+    def __unlink(self, player: str, task_id: int) -> None:
+        self.player_work[player].discard(task_id)
+        self.__changes.append((player, task_id, False))
+        players = self.task_players.get(task_id)
+        if players is not None:
+            players.discard(player)
+            if len(players) == 0:
+                del self.task_players[task_id]
+
+    @write_locked
     def rename_player(self, old_name: str, new_name: str, should_save=True):
+        # Assignments already under the new name are replaced
+        for task_id in self.player_work.get(new_name, set()).copy():
+            self.__unlink(new_name, task_id)
         value = self.player_work.pop(old_name)
+        for task_id in value:
+            players = self.task_players[task_id]
+            players.discard(old_name)
+            players.add(new_name)
+            self.__changes += [(old_name, task_id, False), (new_name, task_id, True)]
         self.player_work[new_name] = value
+        for task in self[new_name]:
+            task.touch()
         if should_save:
             self.save()
         return value
 
-    def rename_task(self, old_title: Union['TitleList', str],
-                    new_title: Union['TitleList', str], should_save=True) -> None:
-        old_title, new_titles = str(old_title), TitleList(old_title)
-        new_titles.pop_tail()
-        new_titles.append(new_title)
-        new_title = str(new_titles)
-        new_data = {}
-        for key, value in self.player_work.items():
-            for t in value:
-                psd = parse(old_title + '{ext}', t)
-                if psd is not None:
-                    new_data[key] = value.copy()
-                    new_data[key].remove(t)
-                    new_data[key].add(new_title + psd['ext'])
-        self.player_work.update(new_data)
-        if should_save:
-            self.save()
-
-    def remove_task(self, task_title: Union['TitleList', str], should_save=True) -> None:
-        task_title = str(task_title)
-        removed = self.player_work.copy()
-        for key, value in self.player_work.items():
-            for t in value.copy():
-                if t.startswith(task_title):
-                    removed[key].remove(t)
-        self.player_work = removed
-        if should_save:
+    @write_locked
+    def remove_task(self, task: 'TaskBase', should_save=True) -> None:
+        """
+        Drop the assignments of a deleted task and its sub-tasks
+        Tasks with responsibles are always materialized, so the rest of the subtree needs no check
+        """
+        removed = False
+        for item in task.iter_materialized():
+            for player in self.task_players.get(item.id, set()).copy():
+                self.__unlink(player, item.id)
+                removed = True
+        if removed and should_save:
             self.save()
 
-    def add_work(self, player: str, task_title: Union['TitleList', str], should_save=True) -> None:
-        task_title = str(task_title)
-        if player not in self.player_work.keys():
-            self.player_work[player] = set()
-        if task_title not in self.player_work[player]:
-            self.player_work[player].add(task_title)
+    @write_locked
+    def add_work(self, player: str, task_title: Union['TitleList', str, 'Task'], should_save=True) -> None:
+        task_id = self.task_manager.resolve(task_title).id
+        if task_id not in self.player_work.get(player, set()):
+            self.__link(player, task_id)
         else:
-            raise DuplicatedTask(task_title + " duplicated")
+            raise DuplicatedTask(str(task_title) + " duplicated")
         if should_save:
             self.save()
 
-    def rm_work(self, player: str, task_title: Union['TitleList', str], should_save=True) -> None:
-        task_title = str(task_title)
-        if player not in self.player_work.keys():
-            self.player_work[player] = set()
-        if task_title not in self.player_work[player]:
-            raise TaskNotFound(TitleList(task_title))
-        self.player_work[player].remove(task_title)
+    @write_locked
+    def rm_work(self, player: str, task_title: Union['TitleList', str, 'Task'], should_save=True) -> None:
+        task = self.task_manager.resolve(task_title)
+        if task.id not in self.player_work.get(player, set()):
+            raise TaskNotFound(task.full_path())
+        self.__unlink(player, task.id)
         if should_save:
             self.save()
 
     def save(self) -> None:
+        changes, self.__changes = self.__changes, []
+        self.task_manager.storage.record_responsibles(self, changes)
+
+    def flush(self) -> None:
         to_save = {}
-        for p, t in self.player_work.items():
-            to_save[p] = list(t)
-        with open(self.path, 'w', encoding='UTF-8') as f:
-            json.dump(to_save, f, indent=4, ensure_ascii=False)
+        with self.lock.read():
+            for p, t in self.player_work.items():
+                to_save[p] = sorted(t)
+        self.task_manager.storage.save_responsibles(to_save)
 
-    def load(self) -> None:
-        if not os.path.isfile(self.path):
-            self.save()
-        with open(self.path, 'r', encoding='UTF-8') as f:
-            to_load = json.load(f)
-        for p, t in to_load.items():
-            self.player_work[p] = set(t)
-
-    def get_responsibles(self, task_title: Union['TitleList', str]):
-        task_title = str(task_title)
-        ret = set()
-        for key, value in self.player_work.items():
-            if task_title in value:
-                ret.add(key)
-        return list(ret)
-
-    def __getitem__(self, player: str) -> Iterator["Task"]:
-        task_titles = self.player_work.get(player, set())
-        for titles in task_titles:
-            yield self.task_manager[titles]
+    def load(self, should_save=True) -> None:
+        data = self.task_manager.storage.load_responsibles()
+        # Materialize the assigned tasks, so that players' tasks are dereferenced directly later
+        tasks = self.task_manager.seek_for_ids({t for value in data.values() for t in value if isinstance(t, int)})
+        migrated, dropped = 0, 0
+        for p, t in data.items():
+            self.player_work[p] = set()
+            for task in t:
+                # Task paths of the old format
+                if isinstance(task, str):
+                    if not self.task_manager.exists(TitleList(task)):
+                        dropped += 1
+                        continue
+                    task = self.task_manager[task].id
+                    migrated += 1
+                elif task not in tasks.keys():
+                    dropped += 1
+                    continue
+                self.__link(p, task)
+        if migrated > 0:
+            GlobalVariables.log(f'Migrated {migrated} responsible assignment(s) from task paths to task ids')
+        if dropped > 0:
+            GlobalVariables.logger.warning(f'Dropped {dropped} responsible assignment(s) of missing tasks')
+        # Loaded assignments are no changes, migrated ones are saved as a whole
+        self.__changes.clear()
+        if (migrated > 0 or dropped > 0) and should_save:
+            GlobalVariables.schedule_save(self)
+
+    @read_locked
+    def get_responsibles(self, task_id: int):
+        return list(self.task_players.get(task_id, set()))
+
+    @read_locked
+    def __getitem__(self, player: str) -> List["Task"]:
+        tasks = [self.task_manager.get_task(task_id) for task_id in self.player_work.get(player, set())]
+        return [task for task in tasks if task is not None]
@@ -1,18 +1,59 @@
-from mcdreforged.api.rtext import *
-
-from mcd_task.task_manager import Task
-from mcd_task.global_variables import GlobalVariables
-from mcd_task.constants import *
-from collections import namedtuple
-from collections import namedtuple
-
+import contextvars
+import functools
+import threading
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Tuple, Iterator, Iterable, List, Optional, Union
+
+from mcdreforged.api.types import CommandSource
 from mcdreforged.api.rtext import *
 
 from mcd_task.constants import *
 from mcd_task.global_variables import GlobalVariables
-from mcd_task.task_manager import Task
+from mcd_task.task_manager import Task, TaskBase
+from mcd_task.utils import TitleList
+
 
 TypeItems = namedtuple('TypeItems', ["name", 'hover_tr_key', 'cmd_fmt'])
+# A line of title_text(task, **options) indented, rendered only when it's displayed
+TitleRow = namedtuple('TitleRow', ['indent', 'task', 'options'])
+
+
+class TaskSnapshot:
+    """
+    What rendered rows read from a task, copied under the read lock so that the rows render without holding it
+    Stands in for the task in title_text() and done_button(), fathers are snapshots up to the manager
+    """
+    __slots__ = ('id', 'revision', 'title', 'titles', 'done', 'is_done', 'deadline', 'priority', 'is_not_empty',
+                 'has_sub_tasks', 'father')
+
+    def __init__(self, task: TaskBase, father: Optional['TaskSnapshot']):
+        self.id = task.id
+        self.revision = task.revision
+        self.title = task.title
+        self.titles = task.titles  # type: TitleList
+        self.done = task.done
+        self.is_done = task.is_done
+        self.deadline = task.deadline
+        self.priority = task.priority
+        self.is_not_empty = task.is_not_empty
+        self.has_sub_tasks = task.has_sub_tasks
+        self.father = father
+
+    @classmethod
+    def take(cls, task: TaskBase) -> 'TaskSnapshot':
+        chain, node = [], task
+        while node is not None:
+            chain.append(node)
+            node = node.father
+        snapshot = None
+        for node in reversed(chain):
+            snapshot = cls(node, snapshot)
+        return snapshot
+
+
+def snapshot_rows(rows: Iterable[TitleRow]) -> List[TitleRow]:
+    return [row._replace(task=TaskSnapshot.take(row.task)) for row in rows]
 
 
 class EditButtonType:
@@ -26,6 +67,61 @@ def tr(key: str, *args, **kwargs):
     return GlobalVariables.tr(key, *args, **kwargs)
 
 
+# Language texts are being rendered in, None if rendering for no specific source
+render_language = contextvars.ContextVar('render_language', default=None)
+# Translated task components: (component, task id, arguments, language) -> (task revision, text)
+# Least recently used ones are evicted beyond render_cache_size, so entries of deleted tasks don't pile up
+render_cache = OrderedDict()  # type: OrderedDict[Tuple[Any, ...], Tuple[int, RTextBase]]
+render_cache_lock = threading.Lock()
+
+
+@contextmanager
+def preferred_language(source: CommandSource):
+    """
+    Render in the preferred language of the command source, which enables the render cache
+    """
+    language = source.get_preference().language
+    token = render_language.set(language)
+    try:
+        with RTextMCDRTranslation.language_context(language):
+            yield language
+    finally:
+        render_language.reset(token)
+
+
+def cached_render(func):
+    """
+    Cache translated components of a task for each language until the task revision changes
+    """
+    @functools.wraps(func)
+    def wrapper(task: Task, *args, **kwargs):
+        language = render_language.get()
+        if language is None:
+            return func(task, *args, **kwargs)
+        key = (func.__name__, task.id, args, tuple(sorted(kwargs.items())), language)
+        with render_cache_lock:
+            cached = render_cache.get(key)
+            if cached is not None and cached[0] == task.revision:
+                render_cache.move_to_end(key)
+                return cached[1]
+        text = freeze(func(task, *args, **kwargs))
+        with render_cache_lock:
+            render_cache[key] = task.revision, text
+            render_cache.move_to_end(key)
+            while len(render_cache) > max(GlobalVariables.config.render_cache_size, 0):
+                render_cache.popitem(last=False)
+        return text
+    return wrapper
+
+
+def freeze(text: RTextBase) -> RTextBase:
+    """
+    Translate the text in current language context, so that it's sent as it is later
+    RTextBase.from_json_object needs MCDR 2.4.0
+    """
+    return RTextBase.from_json_object(text.to_json_object())
+
+
 def indent_text(indent: int) -> str:
     ret = ''
     for num in range(indent):
@@ -38,6 +134,7 @@ def list_done_task_button():
         tr('done_task_hover')).set_color(RColor.dark_gray)
 
 
+@cached_render
 def done_button(task: Task):
     # Done button
     click_event_to_do = 'undone' if task.is_done else 'done'
@@ -60,33 +157,37 @@ def edit_button(task: Task, button_type: TypeItems = EditButtonType.rename):
     return RText("  [✎]").h(tr(button_type.hover_tr_key)).c(RAction.suggest_command, button_type.cmd_fmt.format(task.titles))
 
 
+@cached_render
 def title_text(task: Task, display_full_path=False, with_edit_button=False, indent=4, display_not_empty_mark=False,
                include_sub=True):
     edit = ''
     if with_edit_button:
         edit = edit_button(task)
-    target_title, title_text_list = task.titles.copy(), []
-    while True:
-        if target_title.is_empty:
-            break
-        if not display_full_path and len(title_text_list) == 1:
+    # Walk up to the root once, the manager itself has no father
+    nodes, node = [], task
+    while node.father is not None:
+        nodes.append(node)
+        if not display_full_path:
             break
-        this_title_full = str(target_title)
-        this_title = target_title.pop_tail()
+        node = node.father
+    nodes.reverse()
+    title_text_list = []
+    this_title_full = '' if display_full_path else str(task.titles.parent)
+    for node in nodes:
+        this_title_full = node.title if this_title_full == '' else f'{this_title_full}.{node.title}'
         title_text_list.append(
-            RText(this_title,
-                  RColor.gray if GlobalVariables.task_manager[this_title_full].is_done else RColor.yellow).c(
+            RText(node.title, RColor.gray if node.is_done else RColor.yellow).c(
                 RAction.run_command, f'{PREFIX} detail {this_title_full}').h(tr('info_task_hover', this_title_full))
         )
-    title_text_list.reverse()
     title = RText.join('§7.§r', title_text_list)
     if display_not_empty_mark:
-        if task.is_not_empty or (include_sub and len(task.sub_tasks) > 0):
+        if task.is_not_empty or (include_sub and task.has_sub_tasks):
             title += ' §f[...]'
     return indent_text(indent) + done_button(task) + ' ' + title + edit
 
 
 # !!task detail <titles> components
+@cached_render
 def info_elements(task: Task, button_type: TypeItems = EditButtonType.desc, indent=4):
     return indent_text(indent) + tr(f'detail_{button_type.name}', task.get_elements(button_type.name)).h(
         tr(button_type.hover_tr_key)).c(
@@ -109,6 +210,7 @@ def single_responsible(task: Task, player: str, indent=8, removed=False):
     return text
 
 
+@cached_render
 def info_responsibles(task: Task, indent=4):
     text = indent_text(indent) + info_responsibles_headline(task)
     for player in task.responsibles:
@@ -116,17 +218,39 @@ def info_responsibles(task: Task, indent=4):
     return text
 
 
-def sub_task_title_text(task: Task, indent=4):
-    text = []
+def render_row(row: TitleRow):
+    return indent_text(row.indent) + title_text(row.task, **row.options)
+
+
+def sub_task_title_rows(task: Task, indent=4) -> Iterator[TitleRow]:
     for sub in task.sorted_sub_tasks:
-        text.append(indent_text(indent) + title_text(sub))
-        if len(sub.sub_tasks) > 0:
-            text.append(sub_task_title_text(sub, indent + 4))
-    return RTextBase.join('\n', text)
+        yield TitleRow(indent, sub, {})
+        if sub.has_sub_tasks:
+            yield from sub_task_title_rows(sub, indent + 4)
+
+
+def sub_task_title_text(task: Task, indent=4):
+    return RTextBase.join('\n', [render_row(row) for row in sub_task_title_rows(task, indent)])
+
+
+def page_navigation(cmd: Union[str, Callable[[int], str]], page: int, has_next: bool):
+    """
+    cmd is the command the page number is appended to, or a function building the command of a page
+    """
+    def page_cmd(num: int) -> str:
+        return cmd(num) if callable(cmd) else f'{cmd} {num}'
+
+    prev_button = RText('[<]', RColor.dark_gray)
+    if page > 1:
+        prev_button = RText('[<]', RColor.aqua).c(RAction.run_command, page_cmd(page - 1)).h(tr('prev_page_hover'))
+    next_button = RText('[>]', RColor.dark_gray)
+    if has_next:
+        next_button = RText('[>]', RColor.aqua).c(RAction.run_command, page_cmd(page + 1)).h(tr('next_page_hover'))
+    return prev_button + ' ' + tr('page_number', page) + ' ' + next_button
 
 
 def info_sub_tasks(task: Task, indent=4):
     text = indent_text(indent) + tr('detail_sub') + ' ' + add_task_button(str(task.titles))
-    if len(task.sub_tasks) > 0:
+    if task.has_sub_tasks:
         text += '\n' + sub_task_title_text(task, indent=indent + 4)
     return text
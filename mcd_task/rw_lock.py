@@ -0,0 +1,104 @@
+import contextlib
+import functools
+import threading
+from typing import Callable, Optional
+
+
+class RWLock:
+    """
+    Readers run concurrently while a writer runs alone, waiting writers hold new readers back so that they don't starve
+    Both sides are reentrant in the same thread and the writer could read as well,
+    but a reader must not try to write, which raises RuntimeError instead of deadlocking
+    """
+    def __init__(self):
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = None  # type: Optional[int]
+        self.__writer_depth = 0
+        self.__waiting_writers = 0
+        # Read depth of each thread, and if its outermost read was counted in readers
+        self.__local = threading.local()
+
+    def acquire_read(self) -> None:
+        local = self.__local
+        depth = getattr(local, 'depth', 0)
+        if depth == 0:
+            with self.__condition:
+                # Reads of the writer thread need no counting
+                local.counted = self.__writer != threading.get_ident()
+                if local.counted:
+                    while self.__writer is not None or self.__waiting_writers > 0:
+                        self.__condition.wait()
+                    self.__readers += 1
+        local.depth = depth + 1
+
+    def release_read(self) -> None:
+        local = self.__local
+        local.depth -= 1
+        if local.depth == 0 and local.counted:
+            with self.__condition:
+                self.__readers -= 1
+                if self.__readers == 0:
+                    self.__condition.notify_all()
+
+    def acquire_write(self) -> None:
+        ident = threading.get_ident()
+        with self.__condition:
+            if self.__writer == ident:
+                self.__writer_depth += 1
+                return
+            if getattr(self.__local, 'depth', 0) > 0:
+                raise RuntimeError('Cannot acquire the write lock while holding the read lock')
+            self.__waiting_writers += 1
+            try:
+                while self.__writer is not None or self.__readers > 0:
+                    self.__condition.wait()
+            finally:
+                self.__waiting_writers -= 1
+            self.__writer = ident
+            self.__writer_depth = 1
+
+    def release_write(self) -> None:
+        with self.__condition:
+            self.__writer_depth -= 1
+            if self.__writer_depth == 0:
+                self.__writer = None
+                self.__condition.notify_all()
+
+    @contextlib.contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def read_locked(func: Callable) -> Callable:
+    """
+    Run the method holding the read lock of its instance, which should provide a lock property
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.read():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def write_locked(func: Callable) -> Callable:
+    """
+    Run the method holding the write lock of its instance, which should provide a lock property
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.write():
+            return func(self, *args, **kwargs)
+    return wrapper
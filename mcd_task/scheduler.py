@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Dict, List, Optional, Set, TYPE_CHECKING
+
+from mcd_task.command_actions import task_timed_out
+from mcd_task.global_variables import GlobalVariables
+
+
+if TYPE_CHECKING:
+    from mcd_task.task_manager import Task
+
+
+class DeadlineScheduler(threading.Thread):
+    """
+    Background thread telling online responsibles when deadlines pass or enter the warning threshold
+    Sleeps until the next crossing read from the deadline index, task tree mutations wake it up to reschedule
+    Overdue tasks of each player are precomputed here, so that player login only reads them
+    Online players are carried over from the previous instance on reload, but players already online
+    when the plugin is loaded for the first time are unknown until they rejoin
+    """
+    def __init__(self, online_players: Optional[Set[str]] = None):
+        super().__init__(name='TaskDeadlineScheduler', daemon=True)
+        self.online_players = set(online_players or [])  # type: Set[str]
+        self.__overdue = {}  # type: Dict[str, List[Task]]
+        self.__version = None  # type: Optional[int]
+        self.__last_check = time.time()
+        self.__condition = threading.Condition()
+        self.__woken = False
+        self.__stopped = False
+
+    def wake(self) -> None:
+        with self.__condition:
+            self.__woken = True
+            self.__condition.notify()
+
+    def overdue_tasks(self, player: str) -> List['Task']:
+        return self.__overdue.get(player, [])
+
+    def run(self) -> None:
+        # Materializes undone tasks, done here so that loading the plugin doesn't wait for it
+        try:
+            self.refresh_overdue(self.__last_check)
+        except Exception:
+            GlobalVariables.logger.exception('Failed to collect overdue tasks')
+        while True:
+            # Computed before taking the condition, since mutations holding the write lock wake this thread up
+            timeout = self.__next_timeout()
+            with self.__condition:
+                if not self.__woken and not self.__stopped:
+                    self.__condition.wait(timeout)
+                if self.__stopped:
+                    return
+                self.__woken = False
+            try:
+                self.check()
+            except Exception:
+                GlobalVariables.logger.exception('Failed to check task deadlines')
+
+    def __next_timeout(self) -> Optional[float]:
+        crossing = GlobalVariables.task_manager.next_deadline_crossing()
+        return None if crossing is None else max(crossing - time.time(), 0)
+
+    def check(self) -> None:
+        with GlobalVariables.task_manager.lock.read():
+            self.__check()
+
+    def __check(self) -> None:
+        manager, now = GlobalVariables.task_manager, time.time()
+        threshold = 3600 * 24 * GlobalVariables.config.overview_deadline_warning_threshold
+        passed = manager.seek_for_item_with_deadline_between(self.__last_check, now)
+        approaching = [
+            task for task in manager.seek_for_item_with_deadline_between(self.__last_check + threshold, now + threshold)
+            if task.deadline >= now
+        ]
+        self.__last_check = now
+        if len(passed) > 0 or self.__version != manager.version:
+            self.refresh_overdue(now)
+        self.notify(passed, 'deadline_passed_notice')
+        self.notify(approaching, 'deadline_approaching_notice')
+
+    def refresh_overdue(self, now: float) -> None:
+        manager, overdue = GlobalVariables.task_manager, {}
+        with manager.lock.read():
+            self.__version = manager.version
+            for task in manager.seek_for_item_with_deadline_between(None, now):
+                for player in task.responsibles:
+                    overdue.setdefault(player, []).append(task)
+        self.__overdue = overdue
+
+    def notify(self, tasks: List['Task'], tr_key: str) -> None:
+        player_tasks = {}  # type: Dict[str, List[Task]]
+        for task in tasks:
+            for player in task.responsibles:
+                if player in self.online_players:
+                    player_tasks.setdefault(player, []).append(task)
+        for player, tasks in player_tasks.items():
+            task_timed_out(GlobalVariables.server, player, tasks, tr_key=tr_key)
+
+    def stop(self) -> None:
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,81 @@
+import math
+import re
+from typing import Dict, List, Set
+
+
+# CJK ideographs, kana and hangul, which are written without spaces between words
+CJK_CHARACTERS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+TOKEN_PATTERN = re.compile(r'([{0}]+)|((?:(?![{0}])[^\W_])+)'.format(CJK_CHARACTERS))
+TITLE_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text: str, query: bool = False) -> List[str]:
+    """
+    Case folded words, CJK runs are split into characters and character bigrams
+    Queries take the bigrams only, single characters are kept for runs of one character
+    """
+    tokens = []
+    for cjk, word in TOKEN_PATTERN.findall(text.casefold()):
+        if word != '':
+            tokens.append(word)
+            continue
+        bigrams = [cjk[i:i + 2] for i in range(len(cjk) - 1)]
+        if query:
+            tokens += bigrams if len(bigrams) > 0 else [cjk]
+        else:
+            tokens += list(cjk) + bigrams
+    return tokens
+
+
+class SearchIndex:
+    """
+    Inverted index over task titles and descriptions keyed by task id
+    Fed with raw task data as well, so that searching doesn't materialize the whole tree
+    """
+    def __init__(self):
+        # Token -> task id -> weight of the token in the task
+        self.__postings = {}  # type: Dict[str, Dict[int, int]]
+        self.__tokens = {}  # type: Dict[int, Set[str]]
+
+    def update(self, task_id: int, title: str, description: str) -> None:
+        self.discard(task_id)
+        weights = {}  # type: Dict[str, int]
+        for token in set(tokenize(title)):
+            weights[token] = weights.get(token, 0) + TITLE_WEIGHT
+        for token in set(tokenize(description)):
+            weights[token] = weights.get(token, 0) + DESCRIPTION_WEIGHT
+        for token, weight in weights.items():
+            self.__postings.setdefault(token, {})[task_id] = weight
+        self.__tokens[task_id] = set(weights.keys())
+
+    def discard(self, task_id: int) -> None:
+        for token in self.__tokens.pop(task_id, set()):
+            posting = self.__postings[token]
+            del posting[task_id]
+            if len(posting) == 0:
+                del self.__postings[token]
+
+    def search(self, terms: str) -> List[int]:
+        """
+        Ids of the tasks containing all the terms, best match first
+        Scores sum the weights of the terms in each task, rarer terms weighing more
+        """
+        tokens = set(tokenize(terms, query=True))
+        postings = [self.__postings.get(token, {}) for token in tokens]
+        if len(postings) == 0:
+            return []
+        # Intersect from the rarest term
+        postings.sort(key=len)
+        matched = set(postings[0].keys())
+        for posting in postings[1:]:
+            matched.intersection_update(posting.keys())
+        scores = dict.fromkeys(matched, 0.0)
+        for posting in postings:
+            idf = math.log(1 + len(self.__tokens) / len(posting)) if len(posting) > 0 else 0
+            for task_id in matched:
+                scores[task_id] += posting[task_id] * idf
+        return sorted(matched, key=lambda task_id: (-scores[task_id], task_id))
+
+    def __len__(self) -> int:
+        return len(self.__tokens)
@@ -0,0 +1,401 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional, Dict, List, Any, Callable, Tuple, Union, TYPE_CHECKING
+
+from mcd_task.constants import TASK_PATH, RESG_PATH, DATABASE_PATH
+from mcd_task.exceptions import TaskNotFound, DuplicatedTask
+from mcd_task.global_variables import GlobalVariables
+from mcd_task.journal import TaskJournal
+from mcd_task.utils import TitleList, atomic_write
+
+
+if TYPE_CHECKING:
+    from mcd_task.task_manager import TaskManager, TaskBase
+    from mcd_task.responsible import ResponsibleManager
+
+
+# Key of the storage row id in serialized task data, only used by backends with row ids
+STORAGE_ID = '_storage_id'
+# TaskManager methods which could be recorded to and replayed from the journal
+JOURNALED_OPERATIONS = [
+    'add_task', 'delete_task', 'rename_task', 'set_deadline', 'edit_desc', 'done_task', 'undone_task', 'set_perm',
+    'set_priority'
+]
+
+
+class TaskStorage:
+    """
+    Backend behind TaskManager.load()/save() and ResponsibleManager.load()/save()
+    """
+    def load_tasks(self) -> Optional[Dict[str, Any]]:
+        """
+        Serialized task tree, None if nothing was saved before
+        """
+        raise NotImplementedError()
+
+    def attach(self, manager: 'TaskManager') -> None:
+        """
+        Called once the task tree is deserialized, before responsibles are loaded
+        """
+        pass
+
+    def record(self, manager: 'TaskManager', op: str, titles: str, task: 'TaskBase', *args) -> None:
+        """
+        Persist a single mutation, titles is the task path before the mutation is applied
+        """
+        manager.save()
+
+    def snapshot_tasks(self, manager: 'TaskManager') -> Any:
+        """
+        Called with the task manager read locked, the snapshot is saved by save_tasks() once the lock is released
+        """
+        raise NotImplementedError()
+
+    def save_tasks(self, snapshot: Any) -> None:
+        raise NotImplementedError()
+
+    def load_responsibles(self) -> Dict[str, List[Union[int, str]]]:
+        """
+        Assigned task ids of each player, task paths if saved in the old format
+        """
+        raise NotImplementedError()
+
+    def save_responsibles(self, player_work: Dict[str, List[int]]) -> None:
+        raise NotImplementedError()
+
+    def record_responsibles(self, manager: 'ResponsibleManager', changes: List[Tuple[str, int, bool]]) -> None:
+        """
+        Persist assignments linked (True) or unlinked (False) since the last save
+        """
+        GlobalVariables.schedule_save(manager)
+
+    def close(self) -> None:
+        """
+        Called on plugin unload once everything is flushed
+        """
+        pass
+
+    @staticmethod
+    def create() -> 'TaskStorage':
+        if GlobalVariables.config.storage_backend == 'sqlite':
+            return SqliteStorage()
+        return JsonStorage()
+
+
+class JsonStorage(TaskStorage):
+    """
+    mc_task.json snapshot with a mutation journal, responsible.json for responsibles
+    """
+    def __init__(self, task_path: str = TASK_PATH, responsible_path: str = RESG_PATH):
+        self.task_path = task_path
+        self.responsible_path = responsible_path
+        self.journal = TaskJournal()
+        self.__lock = threading.Lock()
+        # Snapshots are numbered, so that an older one never overwrites a newer one saved before it
+        self.__generation = 0
+        self.__saved_generation = 0
+
+    def load_tasks(self) -> Optional[Dict[str, Any]]:
+        if not os.path.isfile(self.task_path):
+            return None
+        with open(self.task_path, 'r', encoding='utf8') as fp:
+            return json.load(fp)
+
+    def attach(self, manager: 'TaskManager') -> None:
+        # Replay before loading responsibles so that replayed deletions and renames won't touch them twice
+        num = 0
+        for record in self.journal.read(after=manager.journal_seq):
+            if record['op'] not in JOURNALED_OPERATIONS:
+                GlobalVariables.logger.warning(f'Skipped unknown journal operation: {record}')
+                continue
+            try:
+                getattr(manager, record['op'])(TitleList(record['titles']), *record['args'], should_save=False)
+            except (TaskNotFound, DuplicatedTask):
+                GlobalVariables.logger.warning(f'Skipped journal record unable to apply: {record}')
+            else:
+                num += 1
+        self.journal.seq = max(self.journal.seq, manager.journal_seq)
+        if num > 0:
+            GlobalVariables.log(f'Replayed {num} task journal record(s)')
+
+    def record(self, manager: 'TaskManager', op: str, titles: str, task: 'TaskBase', *args) -> None:
+        if not GlobalVariables.config.journal_enabled:
+            manager.save()
+            return
+        self.journal.append(op, titles, *args)
+        if self.journal.size > GlobalVariables.config.journal_compact_threshold:
+            GlobalVariables.debug(f'Task journal reached {self.journal.size} bytes, compacting')
+            manager.save()
+
+    def snapshot_tasks(self, manager: 'TaskManager') -> Tuple[int, int, Dict[str, Any]]:
+        with self.__lock:
+            self.__generation += 1
+            generation = self.__generation
+        journal_seq = manager.journal_seq = self.journal.seq
+        return generation, journal_seq, manager.serialize()
+
+    def save_tasks(self, snapshot: Tuple[int, int, Dict[str, Any]]) -> None:
+        generation, journal_seq, serialized = snapshot
+        data = json.dumps(serialized, indent=4, ensure_ascii=False)
+        GlobalVariables.debug(f'Saving data: {data}')
+        with self.__lock:
+            if generation <= self.__saved_generation:
+                return
+            atomic_write(self.task_path, data)
+            self.journal.truncate(journal_seq)
+            self.__saved_generation = generation
+
+    def load_responsibles(self) -> Dict[str, List[Union[int, str]]]:
+        if not os.path.isfile(self.responsible_path):
+            self.save_responsibles({})
+        with open(self.responsible_path, 'r', encoding='UTF-8') as f:
+            return json.load(f)
+
+    def save_responsibles(self, player_work: Dict[str, List[int]]) -> None:
+        atomic_write(self.responsible_path, json.dumps(player_work, indent=4, ensure_ascii=False))
+
+
+class SqliteStorage(TaskStorage):
+    """
+    Tasks as rows referencing their parent row, responsibles as (player, task id) rows
+    Single mutations are queued and flushed by the persistence worker, one transaction for each
+    """
+    # Schema version kept in user_version, 0 means the json storage is not migrated yet
+    # Version 1 had no task ids and referenced tasks by path in responsibles
+    VERSION = 2
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            parent INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+            title TEXT NOT NULL,
+            task_id INTEGER,
+            done INTEGER NOT NULL DEFAULT 0,
+            description TEXT NOT NULL DEFAULT '',
+            deadline REAL NOT NULL DEFAULT 0,
+            permission INTEGER NOT NULL DEFAULT 0,
+            priority INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS tasks_parent ON tasks(parent);
+        CREATE INDEX IF NOT EXISTS tasks_deadline ON tasks(deadline);
+        CREATE INDEX IF NOT EXISTS tasks_priority ON tasks(priority);
+        CREATE INDEX IF NOT EXISTS tasks_done ON tasks(done);
+        CREATE TABLE IF NOT EXISTS responsibles (
+            player TEXT NOT NULL,
+            task INTEGER NOT NULL,
+            PRIMARY KEY (player, task)
+        );
+    '''
+    # Mutations updating a single column with the first argument
+    COLUMNS = {
+        'rename_task': 'title',
+        'set_deadline': 'deadline',
+        'edit_desc': 'description',
+        'set_perm': 'permission',
+        'set_priority': 'priority'
+    }
+
+    def __init__(self, path: str = DATABASE_PATH):
+        self.path = path
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute('PRAGMA foreign_keys = ON')
+        self.__lock = threading.RLock()
+        self.__pending = []  # type: List[Callable[[sqlite3.Cursor], None]]
+        # Kept apart from task mutations, which are dropped once the task table is rewritten
+        self.__pending_responsibles = []  # type: List[Callable[[sqlite3.Cursor], None]]
+        # Generation of the task table snapshot waiting to be saved, task mutations are held back until it is saved
+        self.__generation = 0
+        self.__rewrite = None  # type: Optional[int]
+        if self.user_version == 1:
+            self.__upgrade_task_ids()
+        self.__connection.executescript(self.SCHEMA)
+        if self.user_version == 0 and not os.path.isfile(TASK_PATH):
+            self.user_version = self.VERSION
+
+    def __upgrade_task_ids(self) -> None:
+        """
+        Old responsible rows are kept in legacy_responsibles until responsibles are saved with task ids
+        """
+        with self.__connection:
+            self.__connection.execute('BEGIN')
+            self.__connection.execute('ALTER TABLE tasks ADD COLUMN task_id INTEGER')
+            self.__connection.execute('ALTER TABLE responsibles RENAME TO legacy_responsibles')
+            self.user_version = self.VERSION
+
+    @property
+    def user_version(self) -> int:
+        return self.__connection.execute('PRAGMA user_version').fetchone()[0]
+
+    @user_version.setter
+    def user_version(self, value: int):
+        self.__connection.execute(f'PRAGMA user_version = {int(value)}')
+
+    def needs_migration(self) -> bool:
+        return self.user_version == 0
+
+    def migrate_from(self, manager: 'TaskManager') -> None:
+        """
+        One-shot import of an already loaded json storage, json files are left untouched as a backup
+        """
+        self.save_tasks(self.snapshot_tasks(manager))
+        self.save_responsibles({p: list(t) for p, t in manager.responsible_manager.player_work.items()})
+        with self.__lock:
+            self.user_version = self.VERSION
+        GlobalVariables.log(f'Migrated task data from {TASK_PATH} and {RESG_PATH} to {self.path}')
+
+    def load_tasks(self) -> Optional[Dict[str, Any]]:
+        with self.__lock:
+            rows = self.__connection.execute(
+                'SELECT id, parent, title, task_id, done, description, deadline, permission, priority FROM tasks '
+                'ORDER BY id'
+            ).fetchall()
+        children = {}  # type: Dict[Optional[int], List[Dict[str, Any]]]
+        for row_id, parent, title, task_id, done, description, deadline, permission, priority in rows:
+            children.setdefault(parent, []).append({
+                'title': title, 'id': task_id, 'done': bool(done), 'description': description,
+                'sub_tasks': children.setdefault(row_id, []), 'deadline': deadline, 'permission': permission,
+                'priority': priority, STORAGE_ID: row_id
+            })
+        return dict(title='TaskManager', sub_tasks=children.get(None, []))
+
+    def record(self, manager: 'TaskManager', op: str, titles: str, task: 'TaskBase', *args) -> None:
+        if op == 'delete_task':
+            def apply(cursor: sqlite3.Cursor):
+                if task.storage_id is not None:
+                    cursor.execute('DELETE FROM tasks WHERE id = ?', (task.storage_id,))
+        elif op in ['done_task', 'undone_task']:
+            def apply(cursor: sqlite3.Cursor):
+                self.__insert(cursor, task)
+                cursor.execute('UPDATE tasks SET done = ? WHERE id = ?', (op == 'done_task', task.storage_id))
+        elif op in self.COLUMNS.keys():
+            def apply(cursor: sqlite3.Cursor):
+                self.__insert(cursor, task)
+                cursor.execute(f'UPDATE tasks SET {self.COLUMNS[op]} = ? WHERE id = ?', (args[0], task.storage_id))
+        else:
+            def apply(cursor: sqlite3.Cursor):
+                self.__insert(cursor, task)
+        with self.__lock:
+            self.__pending.append(apply)
+        GlobalVariables.schedule_save(self)
+
+    def flush(self) -> None:
+        with self.__lock:
+            pending, self.__pending_responsibles = self.__pending_responsibles, []
+            if self.__rewrite is None:
+                pending, self.__pending = self.__pending + pending, []
+            for apply in pending:
+                with self.__connection:
+                    apply(self.__connection.cursor())
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
+
+    @staticmethod
+    def __insert(cursor: sqlite3.Cursor, task: 'TaskBase') -> None:
+        """
+        Insert the task and its ancestors which are not inserted yet
+        """
+        father = task.father
+        if task.storage_id is not None or father is None:
+            return
+        SqliteStorage.__insert(cursor, father)
+        cursor.execute(
+            'INSERT INTO tasks (parent, title, task_id, done, description, deadline, permission, priority) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (father.storage_id, task.title, task.id, task.done, task.description, task.deadline, task.permission,
+             task.priority)
+        )
+        task.storage_id = cursor.lastrowid
+
+    def snapshot_tasks(self, manager: 'TaskManager') -> Tuple[int, List[Tuple['TaskBase', int]], List[tuple], int]:
+        with self.__lock:
+            self.__generation += 1
+            self.__rewrite = generation = self.__generation
+            covered = len(self.__pending)
+        rows = []
+
+        def collect(node: 'TaskBase'):
+            for child in node.sub_tasks:
+                rows.append(child)
+                collect(child)
+        collect(manager)
+        # New rows get explicit ids after the existing ones, so that they never take an id an existing row keeps
+        next_id = max([task.storage_id for task in rows if task.storage_id is not None], default=0) + 1
+        storage_ids = {}  # type: Dict[int, int]
+        for task in rows:
+            if task.storage_id is not None:
+                storage_ids[id(task)] = task.storage_id
+            else:
+                storage_ids[id(task)] = next_id
+                next_id += 1
+        values = [
+            (storage_ids[id(task)], storage_ids.get(id(task.father)), task.title, task.id, task.done, task.description,
+             task.deadline, task.permission, task.priority) for task in rows
+        ]
+        return generation, [(task, storage_ids[id(task)]) for task in rows], values, covered
+
+    def save_tasks(self, snapshot: Tuple[int, List[Tuple['TaskBase', int]], List[tuple], int]) -> None:
+        generation, tasks, values, covered = snapshot
+        with self.__lock:
+            if generation != self.__rewrite:
+                # Superseded by a newer snapshot
+                return
+            try:
+                with self.__connection:
+                    cursor = self.__connection.cursor()
+                    cursor.execute('DELETE FROM tasks')
+                    cursor.executemany(
+                        'INSERT INTO tasks '
+                        '(id, parent, title, task_id, done, description, deadline, permission, priority) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', values
+                    )
+                # Row ids are only taken once the rewrite is committed, queued mutations before the snapshot are
+                # covered by it
+                del self.__pending[:covered]
+                for task, storage_id in tasks:
+                    task.storage_id = storage_id
+            finally:
+                self.__rewrite = None
+            # Mutations queued since the snapshot
+            self.flush()
+
+    def load_responsibles(self) -> Dict[str, List[Union[int, str]]]:
+        ret = {}
+        with self.__lock:
+            legacy = self.__connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'legacy_responsibles'"
+            ).fetchone() is not None
+            table = 'legacy_responsibles' if legacy else 'responsibles'
+            for player, task in self.__connection.execute(f'SELECT player, task FROM {table}'):
+                ret.setdefault(player, []).append(task)
+            if legacy and len(ret) == 0:
+                # Nothing to migrate, assignments are saved one by one to the new table from now on
+                with self.__connection:
+                    self.__connection.execute('DROP TABLE legacy_responsibles')
+        return ret
+
+    def record_responsibles(self, manager: 'ResponsibleManager', changes: List[Tuple[str, int, bool]]) -> None:
+        if len(changes) == 0:
+            return
+
+        def apply(cursor: sqlite3.Cursor):
+            for player, task_id, linked in changes:
+                if linked:
+                    cursor.execute('INSERT OR IGNORE INTO responsibles (player, task) VALUES (?, ?)', (player, task_id))
+                else:
+                    cursor.execute('DELETE FROM responsibles WHERE player = ? AND task = ?', (player, task_id))
+        with self.__lock:
+            self.__pending_responsibles.append(apply)
+        GlobalVariables.schedule_save(self)
+
+    def save_responsibles(self, player_work: Dict[str, List[int]]) -> None:
+        with self.__lock:
+            with self.__connection:
+                self.__connection.execute('DROP TABLE IF EXISTS legacy_responsibles')
+                self.__connection.execute('DELETE FROM responsibles')
+                self.__connection.executemany(
+                    'INSERT INTO responsibles (player, task) VALUES (?, ?)',
+                    [(player, task) for player, tasks in player_work.items() for task in tasks]
+                )
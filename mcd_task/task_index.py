@@ -0,0 +1,94 @@
+import bisect
+from typing import Any, Dict, List, Optional, Tuple, Iterator, TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from mcd_task.task_manager import TaskBase
+
+
+class SortedTaskIndex:
+    """
+    Tasks ordered by a key, tasks without a key are not indexed
+    TaskManager calls update() whenever a field the key depends on changes and discard() when the task is deleted
+    """
+    def __init__(self):
+        self.__entries = []  # type: List[Tuple[Any, int]]
+        self.__tasks = {}  # type: Dict[int, TaskBase]
+        self.__keys = {}  # type: Dict[int, Any]
+
+    @staticmethod
+    def key(task: 'TaskBase') -> Optional[Any]:
+        raise NotImplementedError()
+
+    def update(self, task: 'TaskBase') -> None:
+        self.discard(task)
+        key = self.key(task)
+        if key is not None:
+            ident = id(task)
+            bisect.insort(self.__entries, (key, ident))
+            self.__tasks[ident] = task
+            self.__keys[ident] = key
+
+    def discard(self, task: 'TaskBase') -> None:
+        ident = id(task)
+        if ident not in self.__keys:
+            return
+        index = bisect.bisect_left(self.__entries, (self.__keys.pop(ident), ident))
+        del self.__entries[index]
+        del self.__tasks[ident]
+
+    def iter_tasks(self, since: Optional[Any] = None, until: Optional[Any] = None) -> Iterator['TaskBase']:
+        """
+        Indexed tasks in key order, starts at the first key not less than since and stops before until
+        """
+        entries = self.__entries
+        index = 0 if since is None else bisect.bisect_left(entries, (since,))
+        # Walked in place rather than copying the tail, callers hold the read lock so entries don't change meanwhile
+        while index < len(entries):
+            key, ident = entries[index]
+            if until is not None and key >= until:
+                break
+            task = self.__tasks.get(ident)
+            if task is not None:
+                yield task
+            index += 1
+
+    def count(self, since: Optional[Any] = None, until: Optional[Any] = None) -> int:
+        """
+        Amount of the tasks iter_tasks() yields with the same bounds, counted without iterating
+        """
+        start = 0 if since is None else bisect.bisect_left(self.__entries, (since,))
+        stop = len(self.__entries) if until is None else bisect.bisect_left(self.__entries, (until,))
+        return max(stop - start, 0)
+
+    def next_key(self, since: Any) -> Optional[Any]:
+        """
+        The smallest indexed key not less than since, None if there isn't any
+        """
+        index = bisect.bisect_left(self.__entries, (since,))
+        return self.__entries[index][0] if index < len(self.__entries) else None
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+class DeadlineIndex(SortedTaskIndex):
+    """
+    Undone tasks with a deadline, nearest deadline first
+    """
+    @staticmethod
+    def key(task: 'TaskBase') -> Optional[float]:
+        if task.deadline == 0 or task.is_done:
+            return None
+        return task.deadline
+
+
+class PriorityIndex(SortedTaskIndex):
+    """
+    Undone tasks with a priority, highest priority first
+    """
+    @staticmethod
+    def key(task: 'TaskBase') -> Optional[int]:
+        if not isinstance(task.priority, int) or task.is_done:
+            return None
+        return -task.priority
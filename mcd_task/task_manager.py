@@ -1,24 +1,50 @@
-import json
-import os
+import itertools
+import threading
 import time
 
-from copy import copy
-from typing import List, Dict, Tuple, Any, Union, Optional, Iterable
+from collections import namedtuple
+from typing import List, Dict, Tuple, Any, Union, Optional, Iterable, Iterator
 
-from mcdreforged.api.utils import Serializable, deserialize
+from mcdreforged.api.utils import Serializable, serialize, deserialize
 
-from mcd_task.exceptions import TaskNotFound, DuplicatedTask
+from mcd_task.exceptions import TaskNotFound, DuplicatedTask, IllegalTaskName, IllegalBatchOperation
 from mcd_task.utils import TitleList, formatted_time
-from mcd_task.constants import TASK_PATH, DEBUG_MODE
+from mcd_task.constants import DEBUG_MODE
 from mcd_task.responsible import ResponsibleManager
+from mcd_task.storage import TaskStorage, JsonStorage, SqliteStorage, STORAGE_ID, JOURNALED_OPERATIONS
+from mcd_task.task_index import DeadlineIndex, PriorityIndex
+from mcd_task.search_index import SearchIndex
+from mcd_task.task_query import TaskQuery
+from mcd_task.rw_lock import RWLock, read_locked, write_locked
 from mcd_task.global_variables import GlobalVariables
 
 
 SUB_TASKS = 'rue'
 
+# One TaskManager method call of a batch: method name, task path and the arguments after it
+BatchOperation = namedtuple('BatchOperation', ['op', 'titles', 'args'])
+BATCH_OPERATIONS = JOURNALED_OPERATIONS + ['set_responsible', 'rm_responsible']
+# Concurrent readers could materialize the same task
+materialize_lock = threading.RLock()
+# Concurrent readers could build the search index at the same time
+search_index_lock = threading.Lock()
+
+
+class LazySubTasks:
+    """
+    Non-data descriptor materializing raw sub-task data on first access
+    Once materialized the list is stored in the instance dict, which shadows this descriptor
+    """
+    def __get__(self, instance: Optional["TaskBase"], owner) -> List["Task"]:
+        if instance is None:
+            return []
+        instance.materialize_sub_tasks()
+        return instance.sub_tasks
+
 
 class TaskBase(Serializable):
     title: str = ""
+    id: int = 0
     done: bool = False
     description: str = ''
     sub_tasks: List["Task"] = []
@@ -29,21 +55,60 @@ class TaskBase(Serializable):
     for key, value in locals().copy().items():
         if value is sub_tasks:
             globals()['SUB_TASKS'] = key
+    sub_tasks = LazySubTasks()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._father: Optional["TaskBase"] = None
+        self._storage_id: Optional[int] = None
+        self._raw_sub_tasks: Optional[List[Dict[str, Any]]] = None
+        self._child_map: Dict[str, 'Task'] = {item.title: item for item in vars(self).get(SUB_TASKS, [])}
+        self._manager: Optional['TaskManager'] = None
+        self._path: Optional[TitleList] = None
+        # Done state including the ancestors', refreshed by set_father() and set_done()
+        self._effective_done = False
+        # Increased when anything displayed with this task changes, cached renders of older revisions are stale
+        self._revision = 0
+
+    @property
+    def raw_sub_tasks(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Serialized sub-tasks not materialized yet, None if sub_tasks is materialized
+        """
+        return None if SUB_TASKS in vars(self) else self._raw_sub_tasks
+
+    @property
+    def has_sub_tasks(self) -> bool:
+        raw = self.raw_sub_tasks
+        return len(self.sub_tasks if raw is None else raw) > 0
 
     @property
     def titles(self):
         return self.full_path()
 
+    @property
+    def father(self) -> Optional["TaskBase"]:
+        return self._father
+
+    @property
+    def storage_id(self) -> Optional[int]:
+        """
+        Row id of this task in the storage backend, if the backend has one
+        """
+        return self._storage_id
+
+    @storage_id.setter
+    def storage_id(self, value: Optional[int]):
+        self._storage_id = value
+
     @property
     def child_map(self) -> Dict[str, 'Task']:
-        ret = {}
-        for item in self.sub_tasks:
-            ret[item.title] = item
-        return ret
+        """
+        Title to sub-task index, kept in sync with sub_tasks. Do not modify it directly
+        """
+        if SUB_TASKS not in vars(self):
+            self.materialize_sub_tasks()
+        return self._child_map
 
     @property
     def child_titles(self) -> List[str]:
@@ -62,28 +127,85 @@ class TaskBase(Serializable):
         return False
 
     @property
-    def is_done(self):
-        return self.done or self._father.is_done
+    def is_done(self) -> bool:
+        return self._effective_done
 
-    def full_path(self, titles: 'TitleList' = TitleList()) -> 'TitleList':
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    def touch(self, with_sub_tasks: bool = False) -> None:
+        """
+        Invalidate the cached renders of this task, and of its sub-tasks if they display it as a part of their paths
+        """
+        for item in (self.iter_materialized() if with_sub_tasks else [self]):
+            item._revision += 1
+
+    def set_done(self, done: bool) -> None:
+        self.done = done
+        self.refresh_done()
+
+    def refresh_done(self) -> None:
+        effective_done = self.done or (self._father is not None and self._father.is_done)
+        if effective_done == self._effective_done:
+            return
+        self._effective_done = effective_done
+        if self._manager is not None:
+            self._manager.update_task_indexes(self)
+        # Sub-tasks not materialized yet will pick it up in set_father()
+        if SUB_TASKS in vars(self):
+            for item in self.sub_tasks:
+                item.refresh_done()
+
+    def full_path(self) -> 'TitleList':
         raise NotImplementedError('Not implemented method: TaskBase.full_path()')
 
     def add_task(self, titles: 'TitleList', desc: str = '') -> None:
-        next_gen_title = titles.pop_head()
+        if titles.is_empty:
+            raise IllegalTaskName(titles)
+        next_gen_title, titles = self.next_layer(titles)
         next_gen_desc = desc if titles.is_empty else ''
-        if next_gen_title not in self.child_titles:
+        if next_gen_title not in self.child_map:
             self.__add_task(dict(title=next_gen_title, description=next_gen_desc))
         if not titles.is_empty:
             self.child_map[next_gen_title].add_task(titles, desc)
 
-    def next_layer(self, titles: 'TitleList') -> Tuple[str, TitleList]:
-        next_layer_title = titles.pop_head()
-        if next_layer_title not in next_layer_title:
-            raise TaskNotFound(self.titles.copy().append(next_layer_title))
-        return next_layer_title, titles
+    @staticmethod
+    def next_layer(titles: 'TitleList') -> Tuple[str, TitleList]:
+        return titles.head, titles.rest
 
     def __add_task(self, data: dict):
-        self.sub_tasks.append(Task.deserialize(data).set_father(self))
+        task = Task.deserialize(data).set_father(self)
+        self.sub_tasks.append(task)
+        self._child_map[task.title] = task
+        if self._manager is not None:
+            self._manager.index_task(task)
+
+    def remove_sub_task(self, title: str) -> 'Task':
+        task = self.child_map.pop(title)
+        self.sub_tasks.remove(task)
+        if self._manager is not None:
+            self._manager.unindex_task(task)
+        return task
+
+    def rename_sub_task(self, title: str, new_title: str) -> 'Task':
+        if new_title != title and new_title in self.child_map:
+            raise DuplicatedTask(f'{new_title} duplicated')
+        task = self.child_map.pop(title)
+        task.title = new_title
+        self._child_map[new_title] = task
+        if self._manager is not None:
+            self._manager.reindex_task(task)
+        return task
+
+    def iter_materialized(self) -> Iterable['TaskBase']:
+        """
+        This task and its descendants already materialized, parents first
+        """
+        yield self
+        if SUB_TASKS in vars(self):
+            for item in self.sub_tasks:
+                yield from item.iter_materialized()
 
     def seek_no_father_nodes(self):
         result = []
@@ -93,31 +215,55 @@ class TaskBase(Serializable):
             result += item.seek_no_father_nodes()
         return result
 
+    def materialize_sub_tasks(self) -> None:
+        with materialize_lock:
+            if SUB_TASKS not in vars(self):
+                self.create_sub_tasks_from_serialized_data(self._raw_sub_tasks or [])
+
     def create_sub_tasks_from_serialized_data(self, serialized_task_list: List[Dict[str, Any]]):
-        self.__setattr__(SUB_TASKS, [])
-        for item in serialized_task_list:
-            self.__add_task(item)
+        sub_tasks = [Task.deserialize(item).set_father(self) for item in serialized_task_list]
+        self._child_map = {task.title: task for task in sub_tasks}
+        if self._manager is not None:
+            for task in sub_tasks:
+                self._manager.index_task(task)
+        # Published once built, so that readers never see a partly built list
+        self.__setattr__(SUB_TASKS, sub_tasks)
+        self._raw_sub_tasks = None
 
     def set_father(self, father_node: "TaskBase"):
         if not isinstance(father_node, TaskBase):
             raise TypeError(type(father_node).__name__)
         self._father = father_node
+        self._effective_done = self.done or father_node.is_done
         return self
 
     @classmethod
     def deserialize(cls, data: dict, **kwargs):
-        GlobalVariables.debug(data)
-        sub_tasks = copy(data.get(SUB_TASKS, []))
+        sub_tasks = data.get(SUB_TASKS, [])
         if not isinstance(sub_tasks, list):
             raise TypeError(
                 'Unsupported input type: expected class "{}" but found data with class "{}"'.format(
                     list.__name__, type(data).__name__
                 ))
-        data[SUB_TASKS] = []
-        this_task = deserialize(data=data, cls=cls, **kwargs)
-        this_task.create_sub_tasks_from_serialized_data(sub_tasks)
+        this_task = deserialize(data={k: v for k, v in data.items() if k != SUB_TASKS}, cls=cls, **kwargs)
+        this_task._storage_id = data.get(STORAGE_ID)
+        # Sub-tasks are materialized on first access
+        delattr(this_task, SUB_TASKS)
+        this_task._raw_sub_tasks = sub_tasks
         return this_task
 
+    def serialize(self) -> dict:
+        ret = {}
+        for key in self.get_field_annotations().keys():
+            if key != SUB_TASKS:
+                ret[key] = serialize(getattr(self, key))
+            elif self.raw_sub_tasks is not None:
+                # Untouched subtrees are written back as they were loaded
+                ret[key] = self.raw_sub_tasks
+            else:
+                ret[key] = [item.serialize() for item in self.sub_tasks]
+        return ret
+
     def split_sub_tasks_by_done(self):
         undones, dones = [], []
         for t in self.sub_tasks:
@@ -138,42 +284,24 @@ class TaskBase(Serializable):
         if titles.is_empty:
             return self
         next_layer_title, titles = self.next_layer(titles)
-        if next_layer_title not in self.child_titles:
-            raise TaskNotFound(titles.lappend(next_layer_title))
-        return self.child_map[next_layer_title][titles]
-
-    def seek_for_item_with_priority(self, sort=True, with_done=False):
-        result = []
-        for item in self.sub_tasks:
-            if isinstance(item.priority, int):
-                if with_done or not item.is_done:
-                    result.append(item)
-                    GlobalVariables.debug(f'Priority task found: {item.full_path()}')
-            result += item.seek_for_item_with_priority(sort=False)
-        return sorted(result, key=lambda task: task.priority, reverse=True) if sort else result
-
-    def seek_for_item_with_deadline_approaching(self, sort=True, with_done=False):
-        result = []
-        for item in self.sub_tasks:
-            if item.deadline != 0 and item.deadline - \
-                    time.time() < 3600 * 24 * GlobalVariables.config.overview_deadline_warning_threshold:
-                if with_done or not item.is_done:
-                    result.append(item)
-                    GlobalVariables.debug(f'Deadline task found: {item.full_path()}')
-            result += item.seek_for_item_with_deadline_approaching(sort=False)
-        return sorted(result, key=lambda task: task.deadline, reverse=False) if sort else result
+        child = self.child_map.get(next_layer_title)
+        if child is None:
+            raise TaskNotFound(self.full_path().child(next_layer_title))
+        return child[titles]
 
     @property
     def responsibles(self):
-        return GlobalVariables.task_manager.responsible_manager.get_responsibles(self.titles)
+        return GlobalVariables.task_manager.responsible_manager.get_responsibles(self.id)
 
     def __str__(self):
         return str(self.serialize())
 
 
 class Task(TaskBase):
-    def full_path(self, titles: TitleList = TitleList()) -> TitleList:
-        return self._father.full_path(titles.copy().lappend(self.title))
+    def full_path(self) -> TitleList:
+        if self._path is not None:
+            return self._path
+        return self._father.full_path().child(self.title)
 
     def reinit(self) -> None:
         if DEBUG_MODE:
@@ -194,7 +322,238 @@ class Task(TaskBase):
 
 class TaskManager(TaskBase):
     title: str = "TaskManager"
+    journal_seq: int = 0
+    next_id: int = 1
     __responsible_manager = None
+    __storage = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._manager = self
+        self._path = TitleList()
+        # Full path to task index of all the materialized tasks
+        self._path_index: Dict[TitleList, Task] = {}
+        # Task id to task index of all the materialized tasks
+        self._id_index: Dict[int, Task] = {}
+        # Undone materialized tasks with a deadline
+        self._deadline_index = DeadlineIndex()
+        # Undone materialized tasks with a priority
+        self._priority_index = PriorityIndex()
+        # If all the undone tasks are materialized and so covered by the indexes above
+        self._undone_materialized = False
+        # Increased on every mutation of the task tree or the responsibles
+        self._version = 0
+        # Guards the task tree and the responsibles, mutations write and everything else reads
+        self._lock = RWLock()
+        # Titles and descriptions of all the tasks, built on first search
+        self._search_index: Optional[SearchIndex] = None
+
+    def index_task(self, task: 'Task'):
+        task._manager = self
+        task._path = task.father._path.child(task.title)
+        if task.id == 0:
+            task.id = self.next_id
+            self.next_id += 1
+        self._path_index[task._path] = task
+        self._id_index[task.id] = task
+        self.update_task_indexes(task)
+
+    def unindex_task(self, task: 'Task'):
+        for item in task.iter_materialized():
+            self._path_index.pop(item._path, None)
+            self._id_index.pop(item.id, None)
+            self._deadline_index.discard(item)
+            self._priority_index.discard(item)
+
+    def update_task_indexes(self, task: 'Task'):
+        self._deadline_index.update(task)
+        self._priority_index.update(task)
+
+    def materialize_undone(self, task: Optional[TaskBase] = None):
+        """
+        Materialize every undone task under the specified one, done subtrees are left untouched
+        """
+        stack = [self if task is None else task]
+        while len(stack) > 0:
+            item = stack.pop()
+            if not item.is_done:
+                stack.extend(item.sub_tasks)
+
+    def __ensure_undone_materialized(self):
+        if not self._undone_materialized:
+            self.materialize_undone()
+            self._undone_materialized = True
+
+    @read_locked
+    def seek_for_item_with_deadline_approaching(self, amount: Optional[int] = None) -> List['Task']:
+        """
+        Undone tasks whose deadline is passed or within the warning threshold, nearest deadline first
+        """
+        self.__ensure_undone_materialized()
+        until = time.time() + 3600 * 24 * GlobalVariables.config.overview_deadline_warning_threshold
+        return list(itertools.islice(self._deadline_index.iter_tasks(until=until), amount))
+
+    @read_locked
+    def seek_for_item_with_deadline_between(self, since: Optional[float], until: float) -> List['Task']:
+        """
+        Undone tasks whose deadline is in [since, until), nearest deadline first
+        """
+        self.__ensure_undone_materialized()
+        return list(self._deadline_index.iter_tasks(since=since, until=until))
+
+    @read_locked
+    def next_deadline_crossing(self) -> Optional[float]:
+        """
+        Time when the next undone task passes its deadline or enters the warning threshold
+        """
+        self.__ensure_undone_materialized()
+        crossings = [self._deadline_index.next_key(since=time.time()), self.next_deadline_warning()]
+        crossings = [c for c in crossings if c is not None]
+        return min(crossings) if len(crossings) > 0 else None
+
+    @read_locked
+    def next_deadline_warning(self) -> Optional[float]:
+        """
+        Time when the next undone task enters the deadline warning threshold, None if there isn't any
+        """
+        self.__ensure_undone_materialized()
+        threshold = 3600 * 24 * GlobalVariables.config.overview_deadline_warning_threshold
+        deadline = self._deadline_index.next_key(since=time.time() + threshold)
+        return None if deadline is None else deadline - threshold
+
+    @read_locked
+    def seek_for_item_with_priority(self, amount: Optional[int] = None) -> List['Task']:
+        """
+        Undone tasks with a priority, highest priority first
+        """
+        self.__ensure_undone_materialized()
+        return list(itertools.islice(self._priority_index.iter_tasks(), amount))
+
+    @staticmethod
+    def iter_documents(task: TaskBase) -> Iterator[Tuple[int, str, str]]:
+        """
+        Id, title and description of the task and its descendants, raw subtrees are read without materializing
+        """
+        stack = [task]  # type: List[Union[TaskBase, Dict[str, Any]]]
+        while len(stack) > 0:
+            item = stack.pop()
+            if isinstance(item, dict):
+                yield item.get('id', 0), item.get('title', ''), item.get('description', '')
+                stack.extend(item.get(SUB_TASKS, []))
+            else:
+                yield item.id, item.title, item.description
+                raw = item.raw_sub_tasks
+                stack.extend(item.sub_tasks if raw is None else raw)
+
+    def __ensure_search_index(self) -> SearchIndex:
+        with search_index_lock:
+            if self._search_index is None:
+                index = SearchIndex()
+                for task_id, title, description in self.iter_documents(self):
+                    if task_id != self.id:
+                        index.update(task_id, title, description)
+                self._search_index = index
+        return self._search_index
+
+    def __update_search_index(self, task: TaskBase) -> None:
+        if self._search_index is not None:
+            self._search_index.update(task.id, task.title, task.description)
+
+    @read_locked
+    def search_task_ids(self, terms: str) -> List[int]:
+        """
+        Ids of the tasks with all the terms in their titles or descriptions, best match first
+        Nothing is materialized, get the tasks to show with seek_for_ids()
+        """
+        return self.__ensure_search_index().search(terms)
+
+    @read_locked
+    def query_tasks(self, query: TaskQuery) -> List['Task']:
+        """
+        Tasks matching the query, in the order of the index it's planned with or in full path order
+        """
+        return query.run(self)
+
+    @property
+    def deadline_index(self) -> DeadlineIndex:
+        """
+        Index of all the undone tasks with a deadline
+        """
+        self.__ensure_undone_materialized()
+        return self._deadline_index
+
+    @property
+    def priority_index(self) -> PriorityIndex:
+        """
+        Index of all the undone tasks with a priority
+        """
+        self.__ensure_undone_materialized()
+        return self._priority_index
+
+    def reindex_task(self, task: 'Task'):
+        for item in task.iter_materialized():
+            self._path_index.pop(item._path, None)
+            self.index_task(item)
+
+    def get_task(self, task_id: int) -> Optional['Task']:
+        """
+        Materialized task of the id, all the tasks with responsibles are materialized once loaded
+        """
+        return self._id_index.get(task_id)
+
+    def seek_for_ids(self, task_ids: Iterable[int]) -> Dict[int, 'Task']:
+        """
+        Tasks of the ids, materializing the ones not materialized yet. Ids of no task are left out
+        """
+        ret, missing = {}, set()
+        for task_id in task_ids:
+            if task_id in self._id_index:
+                ret[task_id] = self._id_index[task_id]
+            else:
+                missing.add(task_id)
+        if len(missing) > 0:
+            # Search the serialized subtrees for their paths
+            stack, paths = [], []
+            for item in self.iter_materialized():
+                if item.raw_sub_tasks is not None:
+                    stack.append((item.full_path(), item.raw_sub_tasks))
+            while len(stack) > 0:
+                titles, raw_sub_tasks = stack.pop()
+                for data in raw_sub_tasks:
+                    sub_titles = titles.child(data['title'])
+                    if data.get('id') in missing:
+                        paths.append(sub_titles)
+                    stack.append((sub_titles, data.get(SUB_TASKS, [])))
+            for titles in paths:
+                task = self[titles]
+                ret[task.id] = task
+        return ret
+
+    @staticmethod
+    def __assign_ids(data: Dict[str, Any]) -> Tuple[int, int]:
+        """
+        Give ids to the serialized tasks saved without one
+        :return: amount of the assigned ids and the next id to allocate
+        """
+        stack, without_id, max_id = [data], [], 0
+        while len(stack) > 0:
+            for item in stack.pop().get(SUB_TASKS, []):
+                if item.get('id') in [None, 0]:
+                    without_id.append(item)
+                else:
+                    max_id = max(max_id, item['id'])
+                stack.append(item)
+        for num, item in enumerate(without_id, start=max_id + 1):
+            item['id'] = num
+        return len(without_id), max_id + len(without_id) + 1
+
+    def __getitem__(self, titles: Union[TitleList, str]) -> Union['Task', 'TaskBase']:
+        titles = TitleList(titles)
+        task = self._path_index.get(titles)
+        if task is not None:
+            return task
+        # Not materialized yet or not existing
+        return super().__getitem__(titles)
 
     @property
     def responsible_manager(self):
@@ -202,94 +561,184 @@ class TaskManager(TaskBase):
             self.__responsible_manager = ResponsibleManager(self)
         return self.__responsible_manager
 
+    @property
+    def storage(self) -> TaskStorage:
+        if self.__storage is None:
+            self.__storage = JsonStorage()
+        return self.__storage
+
+    def set_storage(self, storage: TaskStorage):
+        self.__storage = storage
+        return self
+
     def save(self):
-        data = json.dumps(self.serialize(), indent=4, ensure_ascii=False)
-        GlobalVariables.debug(f'Saving data: {data}')
-        with open(TASK_PATH, 'w', encoding='utf8') as fp:
-            fp.write(data)
+        GlobalVariables.schedule_save(self)
+
+    def flush(self):
+        # Only the snapshot is taken under the lock, writers are not held back by the disk
+        with self.lock.read():
+            snapshot = self.storage.snapshot_tasks(self)
+        self.storage.save_tasks(snapshot)
+
+    @property
+    def lock(self) -> RWLock:
+        return self._lock
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def __changed(self) -> None:
+        self._version += 1
+        if GlobalVariables.scheduler is not None:
+            GlobalVariables.scheduler.wake()
+
+    def __record(self, should_save: bool, op: str, titles: str, task: TaskBase, *args) -> None:
+        if op in ['rename_task', 'done_task', 'undone_task']:
+            task.touch(with_sub_tasks=True)
+        elif op in ['add_task', 'delete_task']:
+            # Sub-task marks of the fathers
+            node = task.father
+            while node is not None:
+                node.touch()
+                node = node.father
+        else:
+            task.touch()
+        self.__changed()
+        if should_save:
+            self.storage.record(self, op, titles, task, *args)
 
     @property
     def is_done(self):
         return False
 
     @classmethod
-    def load(cls):
-        if not os.path.isfile(TASK_PATH):
-            cls.get_default().save()
-        with open(TASK_PATH, 'r', encoding='utf8') as fp:
-            js = json.load(fp)
-        manager = cls.deserialize(js)
+    def load(cls, storage: Optional[TaskStorage] = None, should_save=True):
+        """
+        should_save=False leaves the storage as it is, ids assigned on load and migrated responsibles are kept in memory
+        """
+        storage = TaskStorage.create() if storage is None else storage
+        if isinstance(storage, SqliteStorage) and storage.needs_migration():
+            # Json files are kept as a backup readable by older versions
+            storage.migrate_from(cls.load(JsonStorage(), should_save=False))
+        data = storage.load_tasks()
+        if data is None:
+            manager = cls.get_default().set_storage(storage)
+            manager.flush()
+        else:
+            assigned, next_id = cls.__assign_ids(data)
+            manager = cls.deserialize(data).set_storage(storage)
+            manager.next_id = max(manager.next_id, next_id)
+            if assigned > 0:
+                GlobalVariables.log(f'Assigned ids to {assigned} task(s) saved without one')
+                if should_save:
+                    manager.save()
+        storage.attach(manager)
         GlobalVariables.debug(manager.serialize())
-        manager.responsible_manager.load()
+        manager.responsible_manager.load(should_save=should_save)
         return manager
 
-    def exists(self, titles: TitleList) -> bool:
-        titles = titles.copy()
-        father_titles = titles.copy()
-        title = father_titles.pop_tail()
+    @read_locked
+    def find(self, titles: TitleList) -> Optional['Task']:
+        """
+        Task of the path, None if there isn't any
+        """
+        if titles.is_empty:
+            return None
+        task = self._path_index.get(titles)
+        if task is not None:
+            return task
         try:
-            father = self[father_titles]
+            return self[titles]
         except TaskNotFound:
-            return False
-        if title in father.child_titles:
-            return True
-        else:
-            return False
+            return None
 
-    def full_path(self, titles: 'TitleList' = TitleList()) -> 'TitleList':
-        return titles
+    def exists(self, titles: TitleList) -> bool:
+        return self.find(titles) is not None
+
+    def full_path(self) -> 'TitleList':
+        return self._path
+
+    def resolve(self, target: Union[TitleList, str, 'Task']) -> 'Task':
+        """
+        Task of a path, or the task itself if it's a handle resolved before, raises TaskNotFound
+        Handles are followed through renames, but not ones of deleted tasks
+        """
+        if isinstance(target, TaskBase):
+            if self._id_index.get(target.id) is not target:
+                raise TaskNotFound(target.full_path())
+            return target
+        return self[target]
 
     #   =========================
 
-    def add_task(self, titles: 'TitleList', desc: str = '', should_save=True) -> None:
+    @write_locked
+    def add_task(self, titles: 'TitleList', desc: str = '', next_id: Optional[int] = None,
+                 should_save=True) -> None:
+        if next_id is not None:
+            # Replaying, allocate the same ids as recorded
+            self.next_id = next_id
+        next_id = self.next_id
         super(TaskManager, self).add_task(titles, desc)
-        if should_save:
-            self.save()
-
-    def delete_task(self, titles: 'TitleList', should_save=True) -> None:
-        titles_father = titles.copy()
-        title_to_del = titles_father.pop_tail()
-        father_delete = self[titles_father]
-        try:
-            task = father_delete.child_map[title_to_del]
-        except KeyError:
-            raise TaskNotFound(titles.copy(), father_delete.full_path().copy())
-        father_delete.sub_tasks.remove(task)
-        self.responsible_manager.remove_task(titles)
-
-        if should_save:
-            self.save()
-
-    def rename_task(self, titles: 'TitleList', new_title: str, should_save=True) -> None:
-        self[titles.copy()].title = new_title
-        new_titles = titles.copy()
-        new_titles.pop_tail()
-        new_titles.append(new_title)
-        self.responsible_manager.rename_task(titles, new_title)
-        if should_save:
-            self.save()
-
-    def set_deadline(self, titles: 'TitleList', deadline: float, should_save=True) -> None:
-        self[titles].deadline = deadline
-        if should_save:
-            self.save()
-
-    def edit_desc(self, titles: 'TitleList', new_desc: str, should_save=True) -> None:
-        self[titles].description = new_desc
-        if should_save:
-            self.save()
-
-    def done_task(self, titles: 'TitleList', should_save=True):
-        self[titles].done = True
-        if should_save:
-            self.save()
-
-    def undone_task(self, titles: 'TitleList', should_save=True):
-        self[titles].done = False
-        if should_save:
-            self.save()
-
-    def set_responsible(self, titles: TitleList, *res):
+        # Fathers created along with it as well
+        node = self
+        for title in titles:
+            node = node.child_map[title]
+            self.__update_search_index(node)
+        self.__record(should_save, 'add_task', str(titles), node, desc, next_id)
+
+    @write_locked
+    def delete_task(self, titles: Union['TitleList', 'Task'], should_save=True) -> None:
+        task = self.resolve(titles)
+        task.father.remove_sub_task(task.title)
+        if self._search_index is not None:
+            for task_id, _, _ in self.iter_documents(task):
+                self._search_index.discard(task_id)
+        self.responsible_manager.remove_task(task, should_save=should_save)
+        self.__record(should_save, 'delete_task', str(task.full_path()), task)
+
+    @write_locked
+    def rename_task(self, titles: Union['TitleList', 'Task'], new_title: str, should_save=True) -> None:
+        task = self.resolve(titles)
+        path = str(task.full_path())
+        task.father.rename_sub_task(task.title, new_title)
+        self.__update_search_index(task)
+        self.__record(should_save, 'rename_task', path, task, new_title)
+
+    @write_locked
+    def set_deadline(self, titles: Union['TitleList', 'Task'], deadline: float, should_save=True) -> None:
+        task = self.resolve(titles)
+        path = str(task.full_path())
+        task.deadline = deadline
+        self.update_task_indexes(task)
+        self.__record(should_save, 'set_deadline', path, task, deadline)
+
+    @write_locked
+    def edit_desc(self, titles: Union['TitleList', 'Task'], new_desc: str, should_save=True) -> None:
+        task = self.resolve(titles)
+        path = str(task.full_path())
+        task.description = new_desc
+        self.__update_search_index(task)
+        self.__record(should_save, 'edit_desc', path, task, new_desc)
+
+    @write_locked
+    def done_task(self, titles: Union['TitleList', 'Task'], should_save=True):
+        task = self.resolve(titles)
+        path = str(task.full_path())
+        task.set_done(True)
+        self.__record(should_save, 'done_task', path, task)
+
+    @write_locked
+    def undone_task(self, titles: Union['TitleList', 'Task'], should_save=True):
+        task = self.resolve(titles)
+        path = str(task.full_path())
+        task.set_done(False)
+        if self._undone_materialized:
+            self.materialize_undone(task)
+        self.__record(should_save, 'undone_task', path, task)
+
+    @write_locked
+    def set_responsible(self, titles: Union['TitleList', 'Task'], *res, should_save=True):
         num = 0
         for r in res:
             try:
@@ -298,10 +747,14 @@ class TaskManager(TaskBase):
                 pass
             else:
                 num += 1
-        self.responsible_manager.save()
+        self.resolve(titles).touch()
+        self.__changed()
+        if should_save:
+            self.responsible_manager.save()
         return num
 
-    def rm_responsible(self, titles: TitleList, *res):
+    @write_locked
+    def rm_responsible(self, titles: Union['TitleList', 'Task'], *res, should_save=True):
         removed = set()
         for r in res:
             try:
@@ -310,19 +763,86 @@ class TaskManager(TaskBase):
                 pass
             else:
                 removed.add(r)
-        self.responsible_manager.save()
+        self.resolve(titles).touch()
+        self.__changed()
+        if should_save:
+            self.responsible_manager.save()
         return removed
 
-    def set_perm(self, titles: TitleList, perm_level: int, should_save=True) -> None:
+    @write_locked
+    def set_perm(self, titles: Union['TitleList', 'Task'], perm_level: int, should_save=True) -> None:
         if perm_level in [0, 1, 2, 3, 4]:
-            self[titles].permission = perm_level
-            if should_save:
-                self.save()
+            task = self.resolve(titles)
+            path = str(task.full_path())
+            task.permission = perm_level
+            self.__record(should_save, 'set_perm', path, task, perm_level)
+
+    @write_locked
+    def set_priority(self, titles: Union['TitleList', 'Task'], priority: int, should_save=True) -> None:
+        task = self.resolve(titles)
+        path = str(task.full_path())
+        task.priority = priority
+        self.update_task_indexes(task)
+        self.__record(should_save, 'set_priority', path, task, priority)
 
-    def set_priority(self, titles: TitleList, priority: int, should_save=True) -> None:
-        self[titles].priority = priority
-        if should_save:
-            self.save()
+    #   =========================
+
+    @write_locked
+    def apply_batch(self, operations: List[BatchOperation]) -> None:
+        """
+        All the operations are validated first, none of them is applied if any is illegal
+        Applied in memory and saved once, raises IllegalBatchOperation with the index of the illegal one
+        """
+        self.__validate_batch(operations)
+        for op, titles, args in operations:
+            getattr(self, op)(titles, *args, should_save=False)
+        self.save()
+        self.responsible_manager.save()
+
+    def __validate_batch(self, operations: List[BatchOperation]) -> None:
+        """
+        Check each operation against the tree left by the ones before it, without touching the tree
+        """
+        history = []  # type: List[BatchOperation]
+
+        def exists(titles: TitleList) -> bool:
+            if titles.is_empty:
+                return False
+            for op, done_titles, args in reversed(history):
+                if op == 'add_task' and done_titles.startswith(titles):
+                    return True
+                if op == 'delete_task' and titles.startswith(done_titles):
+                    return False
+                if op == 'rename_task':
+                    new_titles = done_titles.parent.child(args[0])
+                    if titles.startswith(new_titles):
+                        # Path before the rename
+                        titles = TitleList(done_titles.titles + titles.titles[len(new_titles):])
+                    elif titles.startswith(done_titles):
+                        return False
+            return self.exists(titles)
+
+        for index, operation in enumerate(operations):
+            op, titles, args = operation
+            try:
+                if op not in BATCH_OPERATIONS:
+                    raise ValueError(f'Unknown operation: {op}')
+                if op == 'add_task':
+                    if titles.is_empty or '' in titles.titles:
+                        raise IllegalTaskName(titles)
+                    if exists(titles):
+                        raise DuplicatedTask(f'{titles} duplicated')
+                elif not exists(titles):
+                    raise TaskNotFound(titles)
+                elif op == 'rename_task':
+                    if args[0] == '' or '.' in args[0]:
+                        raise IllegalTaskName(args[0])
+                    new_titles = titles.parent.child(args[0])
+                    if new_titles != titles and exists(new_titles):
+                        raise DuplicatedTask(f'{new_titles} duplicated')
+            except (ValueError, TaskNotFound, DuplicatedTask, IllegalTaskName) as exc:
+                raise IllegalBatchOperation(index, exc)
+            history.append(operation)
 
 
 def sort_by_title(unsorted_task_list: Iterable[Task]):
@@ -0,0 +1,188 @@
+import itertools
+import operator
+import re
+import time
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from mcd_task.global_variables import GlobalVariables
+from mcd_task.utils import TitleList
+
+
+if TYPE_CHECKING:
+    from mcd_task.task_manager import TaskManager, TaskBase, Task
+
+
+# A field compared with a value, value is None for "none"
+Condition = namedtuple('Condition', ['field', 'op', 'value'])
+# Where the candidates come from: description, estimated amount of the candidates and the candidates
+Plan = namedtuple('Plan', ['source', 'estimate', 'candidates'])
+
+COMPARISON_PATTERN = re.compile(r'^(priority|deadline|permission)(<=|>=|!=|=|<|>)(.+)$')
+SELECTOR_PATTERN = re.compile(r'^(res|responsible|under):(.+)$')
+OPERATORS = {
+    '=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge
+}  # type: Dict[str, Callable[[float, float], bool]]
+
+
+class TaskQuery:
+    """
+    Tasks matching all the conditions, e.g. "undone under:Witch_Hut priority>=3 deadline<2 res:Steve"
+    Deadlines are given in days from now, the candidates come from the most selective index or restriction
+    """
+    def __init__(self, conditions: List[Condition]):
+        self.conditions = conditions
+
+    @classmethod
+    def parse(cls, words: Iterable[str]) -> 'TaskQuery':
+        """
+        Raises ValueError for illegal conditions
+        """
+        conditions = []
+        for word in words:
+            if word in ['done', 'undone']:
+                conditions.append(Condition('done', '=', word == 'done'))
+                continue
+            matched = COMPARISON_PATTERN.match(word)
+            if matched is not None:
+                field, op, value = matched.groups()
+                if value == 'none':
+                    if op not in ['=', '!='] or field == 'permission':
+                        raise ValueError(f'Illegal condition: {word}')
+                    conditions.append(Condition(field, op, None))
+                else:
+                    try:
+                        value = (float if field == 'deadline' else int)(value)
+                    except ValueError:
+                        raise ValueError(f'Illegal condition: {word}') from None
+                    conditions.append(Condition(field, op, value))
+                continue
+            matched = SELECTOR_PATTERN.match(word)
+            if matched is not None:
+                field, value = matched.groups()
+                if field == 'under':
+                    conditions.append(Condition('under', '=', TitleList(value)))
+                else:
+                    conditions.append(Condition('responsible', '=', value))
+                continue
+            raise ValueError(f'Illegal condition: {word}')
+        return cls(conditions)
+
+    def __fields(self, field: str) -> List[Condition]:
+        return [condition for condition in self.conditions if condition.field == field]
+
+    @staticmethod
+    def __field_value(task: 'TaskBase', field: str, now: float) -> Optional[float]:
+        if field == 'deadline':
+            return None if task.deadline == 0 else (task.deadline - now) / (3600 * 24)
+        if field == 'priority':
+            return task.priority if isinstance(task.priority, int) else None
+        return task.permission
+
+    def match(self, task: 'TaskBase', now: float) -> bool:
+        for field, op, value in self.conditions:
+            if field == 'done':
+                if task.is_done != value:
+                    return False
+            elif field == 'responsible':
+                if value not in task.responsibles:
+                    return False
+            elif field == 'under':
+                titles = task.titles
+                if len(titles) <= len(value) or not titles.startswith(value):
+                    return False
+            else:
+                actual = self.__field_value(task, field, now)
+                if value is None:
+                    # "none" is only compared with = and !=
+                    if (actual is None) != (op == '='):
+                        return False
+                elif actual is None or not OPERATORS[op](actual, value):
+                    return False
+        return True
+
+    def __index_bounds(self, field: str, now: float) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        """
+        Key bounds of the index covering the conditions on the field, or None if the index can't serve them
+        Bounds could be loose, the candidates are matched against the conditions anyway
+        """
+        conditions = self.__fields(field)
+        if len(conditions) == 0 or any(op == '!=' if value is not None else op == '=' for _, op, value in conditions):
+            return None
+        since, until = None, None
+        # Indexed tasks always have the field set, so "!=none" needs no bounds
+        for _, op, value in filter(lambda condition: condition.value is not None, conditions):
+            if field == 'deadline':
+                # Deadline index keys are timestamps
+                low, high = now + value * 3600 * 24, now + value * 3600 * 24 + 1
+            else:
+                # Priority index keys are negative priorities
+                low, high = -value, -value + 1
+                op = {'<': '>', '<=': '>=', '>': '<', '>=': '<='}.get(op, op)
+            if op in ['=', '>', '>=']:
+                since = low if since is None else max(since, low)
+            if op in ['=', '<', '<=']:
+                until = high if until is None else min(until, high)
+        return since, until
+
+    def plan(self, manager: 'TaskManager', now: float) -> Plan:
+        """
+        The source with the least candidates among responsibles, deadline or priority indexes and subtree restrictions,
+        falls back to the whole tree
+        """
+        plans = []
+        for _, _, player in self.__fields('responsible'):
+            task_ids = manager.responsible_manager.player_work.get(player, set())
+            plans.append(Plan(f'responsibles of {player}', len(task_ids), lambda ids=task_ids: sorted(
+                filter(None, map(manager.get_task, ids)), key=lambda task: str(task.titles)
+            )))
+        # Indexes cover undone tasks only
+        if Condition('done', '=', False) in self.conditions:
+            for field in ['deadline', 'priority']:
+                bounds = self.__index_bounds(field, now)
+                if bounds is not None:
+                    index = manager.deadline_index if field == 'deadline' else manager.priority_index
+                    plans.append(Plan(
+                        f'{field} index', index.count(*bounds), lambda i=index, b=bounds: i.iter_tasks(*b)
+                    ))
+        for _, _, titles in self.__fields('under'):
+            task = manager.find(titles)
+            if task is None:
+                return Plan(f'missing subtree {titles}', 0, lambda: [])
+            # Counting stops once the subtree is no smaller than the best plan so far,
+            # so that counting a large subtree never costs more than the plan taken instead
+            limit = min([plan.estimate for plan in plans], default=None)
+            plans.append(Plan(
+                f'subtree {titles}', self.__subtree_size(manager, task, limit),
+                lambda root=task: self.__subtree_candidates(root)
+            ))
+        if len(plans) > 0:
+            return min(plans, key=lambda plan: plan.estimate)
+        return Plan('whole tree', None, lambda: self.__subtree_candidates(manager))
+
+    @staticmethod
+    def __subtree_size(manager: 'TaskManager', root: 'TaskBase', limit: Optional[int]) -> int:
+        """
+        Amount of the descendants of the root counted without materializing them, up to limit + 1
+        """
+        documents = manager.iter_documents(root)
+        if limit is not None:
+            documents = itertools.islice(documents, limit + 2)
+        return sum(1 for _ in documents) - 1
+
+    @staticmethod
+    def __subtree_candidates(root: 'TaskBase') -> Iterable['Task']:
+        """
+        Descendants of the root in title order, materializing them
+        """
+        stack = list(reversed(root.sorted_sub_tasks))
+        while len(stack) > 0:
+            task = stack.pop()
+            yield task
+            stack.extend(reversed(task.sorted_sub_tasks))
+
+    def run(self, manager: 'TaskManager') -> List['Task']:
+        now = time.time()
+        plan = self.plan(manager, now)
+        GlobalVariables.debug(f'Query planned with {plan.source}, estimated {plan.estimate} candidate(s)')
+        return [task for task in plan.candidates() if self.match(task, now)]
@@ -1,5 +1,7 @@
+import os
 import time
-from typing import Optional, Union, List
+import weakref
+from typing import Optional, Union, Tuple, Iterator
 
 from mcdreforged.command.command_source import CommandSource, PlayerCommandSource
 
@@ -7,57 +9,93 @@ from mcd_task.global_variables import GlobalVariables
 
 
 class TitleList:
-    def __init__(self, titles: Optional[Union[str, 'TitleList']] = None):
-        self.titles = list(str(titles).split('.')) if titles is not None else []
-        self.__removed = []
+    """
+    Immutable dotted task path backed by a tuple of titles
+    Equal paths share one instance, string form and hash are computed once, so it is cheap as a dict key
+    """
+    __slots__ = ('__titles', '__str', '__hash', '__parent', '__weakref__')
+    __instances = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary[Tuple[str, ...], TitleList]
+
+    def __new__(cls, titles: Optional[Union[str, 'TitleList', Tuple[str, ...]]] = None):
+        if isinstance(titles, TitleList):
+            return titles
+        if isinstance(titles, tuple):
+            key = titles
+        elif titles is None or str(titles) == '':
+            key = ()
+        else:
+            key = tuple(str(titles).split('.'))
+        instance = cls.__instances.get(key)
+        if instance is None:
+            instance = super().__new__(cls)
+            instance.__titles = key
+            instance.__str = '.'.join(key)
+            instance.__hash = hash(key)
+            instance.__parent = None
+            cls.__instances[key] = instance
+        return instance
 
-    def pop_head(self) -> str:
-        ret = self.titles.pop(0)
-        self.__removed.append(ret)
-        return ret
+    @property
+    def titles(self) -> Tuple[str, ...]:
+        return self.__titles
 
-    def pop_tail(self) -> str:
-        ret = self.titles.pop()
-        self.__removed = self.removed.copy().lappend(ret).titles
-        return ret
+    @property
+    def head(self) -> Optional[str]:
+        return self.__titles[0] if len(self.__titles) > 0 else None
 
     @property
-    def removed(self):
-        return TitleList('.'.join(self.__removed).strip('.'))
+    def tail(self) -> Optional[str]:
+        return self.__titles[-1] if len(self.__titles) > 0 else None
 
     @property
-    def head(self) -> Optional[str]:
-        ts = self.titles
-        return self.titles[0] if len(ts) > 0 else None
+    def rest(self) -> 'TitleList':
+        """
+        Path without its head
+        """
+        return TitleList(self.__titles[1:])
 
     @property
-    def tail(self) -> str:
-        return self.titles[-1]
-
-    def copy(self) -> 'TitleList':
-        r = TitleList()
-        r.titles = self.titles[:]
-        return r
-
-    def lappend(self, title: str) -> 'TitleList':
-        titles = self.titles.copy()   # type: List[str]
-        titles.reverse()
-        titles.append(title)
-        titles.reverse()
-        self.titles = titles.copy()
-        return self
-
-    def append(self, title: str) -> 'TitleList':
-        self.titles.append(title)
-        return self
+    def parent(self) -> 'TitleList':
+        """
+        Path without its tail
+        """
+        if self.__parent is None:
+            self.__parent = TitleList(self.__titles[:-1])
+        return self.__parent
+
+    def child(self, title: str) -> 'TitleList':
+        return TitleList(self.__titles + (title,))
+
+    def startswith(self, prefix: 'TitleList') -> bool:
+        """
+        If prefix is this path or one of its ancestors
+        """
+        return self.__titles[:len(prefix)] == prefix.titles
 
     @property
     def is_empty(self) -> bool:
-        return len(self.titles) == 0
+        return len(self.__titles) == 0
+
+    def __len__(self) -> int:
+        return len(self.__titles)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__titles)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TitleList):
+            return self is other or self.__titles == other.titles
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return self.__hash
 
     # No longer support python 2.x and MCDeamon so no __unicode__ method
     def __str__(self) -> str:
-        return '.'.join(self.titles)
+        return self.__str
+
+    def __repr__(self) -> str:
+        return f'TitleList({self.__str!r})'
 
 
 def formatted_time(timestamp: float, locale: Optional[str] = None) -> str:
@@ -70,6 +108,21 @@ def formatted_time(timestamp: float, locale: Optional[str] = None) -> str:
     return time.strftime(GlobalVariables.server.tr("mcd_task.time_format", lang=locale), time.localtime(timestamp))
 
 
+def atomic_write(path: str, data: str) -> None:
+    """
+    Write to a temp file then rename it to the target, so the target is never left half-written
+    :param path:
+    :param data:
+    :return:
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf8') as fp:
+        fp.write(data)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temp_path, path)
+
+
 def source_name(source: CommandSource):
     if isinstance(source, PlayerCommandSource):
         return source.player
@@ -0,0 +1,39 @@
+"""
+Path lookups on a wide node against rebuilding the title to child map on every segment, as before the child index
+"""
+from benchmark import setup_plugin, report
+
+
+CHILDREN = 5000
+NUMBER = 2000
+
+
+def rebuilt_lookup(node, titles):
+    for title in titles:
+        node = {child.title: child for child in node.sub_tasks}[title]
+    return node
+
+
+def rebuilt_exists(node, titles):
+    for title in titles:
+        if title not in [child.title for child in node.sub_tasks]:
+            return False
+        node = {child.title: child for child in node.sub_tasks}[title]
+    return True
+
+
+def main():
+    plugin = setup_plugin()
+    manager = plugin.TaskManager.get_default()
+    for num in range(CHILDREN):
+        plugin.TaskBase.add_task(manager, plugin.TitleList(f'wide.t{num}'))
+    titles = plugin.TitleList(f'wide.t{CHILDREN - 1}')
+    print(f'Node with {CHILDREN} children')
+    report('rebuilt map lookup', lambda: rebuilt_lookup(manager, titles), NUMBER)
+    report('child index TaskManager[...]', lambda: manager[titles], NUMBER)
+    report('rebuilt map exists', lambda: rebuilt_exists(manager, titles), NUMBER)
+    report('child index TaskManager.exists', lambda: manager.exists(titles), NUMBER)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Overview queries on a 100k-node tree against the recursive tree walks used before the deadline and priority indexes
+"""
+import random
+import time
+
+from benchmark import setup_plugin, report
+
+
+# 100 x 100 x 10 nodes
+WIDTHS = (100, 100, 9)
+AMOUNT = 10
+NUMBER = 20
+
+
+def walked_priority(node, sort=True):
+    result = []
+    for item in node.sub_tasks:
+        if isinstance(item.priority, int) and not item.is_done:
+            result.append(item)
+        result += walked_priority(item, sort=False)
+    return sorted(result, key=lambda task: task.priority, reverse=True) if sort else result
+
+
+def walked_deadline(node, threshold: float, sort=True):
+    result = []
+    for item in node.sub_tasks:
+        if item.deadline != 0 and item.deadline - time.time() < threshold and not item.is_done:
+            result.append(item)
+        result += walked_deadline(item, threshold, sort=False)
+    return sorted(result, key=lambda task: task.deadline) if sort else result
+
+
+def build(plugin):
+    manager, rand, TitleList = plugin.TaskManager.load(), random.Random(1), plugin.TitleList
+    plugin.GlobalVariables.setup_task_manager(manager)
+    for i in range(WIDTHS[0]):
+        manager.add_task(TitleList(f'p{i}'), should_save=False)
+        for j in range(WIDTHS[1]):
+            manager.add_task(TitleList(f'p{i}.q{j}'), should_save=False)
+            for k in range(WIDTHS[2]):
+                titles = TitleList(f'p{i}.q{j}.r{k}')
+                manager.add_task(titles, should_save=False)
+                value = rand.random()
+                if value < 0.05:
+                    manager.set_priority(titles, rand.randint(0, 100), should_save=False)
+                elif value < 0.08:
+                    manager.set_deadline(titles, time.time() + rand.randint(-5, 30) * 86400, should_save=False)
+                if rand.random() < 0.3:
+                    manager.done_task(titles, should_save=False)
+    return manager
+
+
+def main():
+    plugin = setup_plugin()
+    plugin.GlobalVariables.config.journal_enabled = False
+    manager = build(plugin)
+    threshold = 3600 * 24 * plugin.GlobalVariables.config.overview_deadline_warning_threshold
+    walked = [task.priority for task in walked_priority(manager)[:AMOUNT]]
+    indexed = [task.priority for task in manager.seek_for_item_with_priority(AMOUNT)]
+    assert walked == indexed, 'Priority index disagrees with the tree walk'
+    print(f'Tree of {sum(1 for _ in manager.iter_documents(manager)) - 1} nodes, '
+          f'{len(manager.priority_index)} undone prioritized')
+    report('walked priority seek', lambda: walked_priority(manager), NUMBER)
+    report(f'priority index top {AMOUNT}', lambda: manager.seek_for_item_with_priority(AMOUNT), NUMBER * 100)
+    report('walked deadline seek', lambda: walked_deadline(manager, threshold), NUMBER)
+    report(f'deadline index top {AMOUNT}', lambda: manager.seek_for_item_with_deadline_approaching(AMOUNT),
+           NUMBER * 100)
+    titles = plugin.TitleList('p5.q5.r5')
+    report('set_priority with index', lambda: manager.set_priority(titles, random.randint(0, 100), should_save=False),
+           NUMBER * 100)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Shared setup of the benchmarks, which run as scripts, e.g. python tests/bench_child_index.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+from typing import Callable
+
+
+class Logger:
+    def __getattr__(self, item):
+        # debug, info, warning, error, exception and unset_file are all dropped
+        return lambda *args, **kwargs: None
+
+
+def setup_plugin():
+    """
+    Import the plugin with its data folder in a temporary directory, the data paths are relative to it
+    """
+    os.chdir(tempfile.mkdtemp(prefix='mcd_task_bench_'))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from mcd_task.global_variables import GlobalVariables
+    from mcd_task.config import Config
+    GlobalVariables.logger = Logger()
+    GlobalVariables.set_config(Config.get_default())
+    import mcd_task
+    return mcd_task
+
+
+def report(name: str, func: Callable[[], object], number: int) -> float:
+    """
+    Print and return the average time of a call in microseconds
+    """
+    cost = timeit.timeit(func, number=number) / number * 1e6
+    print(f'{name:<40} {cost:>12.1f} us')
+    return cost
@@ -0,0 +1,177 @@
+"""
+Stress test of the task manager lock: mixed commands from many threads against the persistence and scheduler threads
+"""
+import importlib
+import random
+import sys
+import threading
+
+import pytest
+from mcdreforged.api.all import RText
+
+
+WRITERS, READERS = 6, 6
+WRITER_OPERATIONS, READER_OPERATIONS = 1000, 300
+TOP_TASKS, SUB_TASKS = 30, 10
+PLAYERS = ['Alice', 'Bob', 'Carol']
+
+
+class Logger:
+    def debug(self, msg, no_check=False):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+    def exception(self, msg):
+        pass
+
+    def unset_file(self):
+        pass
+
+
+class Server:
+    def rtr(self, key, *args, **kwargs):
+        return RText(key + ':' + ','.join(map(str, args)))
+
+    def tr(self, key, *args, **kwargs):
+        return key
+
+    def tell(self, *args, **kwargs):
+        pass
+
+
+class Preference:
+    language = 'en_us'
+
+
+class Source:
+    def get_preference(self):
+        return Preference()
+
+    def reply(self, text):
+        text.to_plain_text()
+
+    def has_permission(self, level):
+        return True
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    # Data paths are relative to the working directory, which is created on import
+    monkeypatch.chdir(tmp_path)
+    for name in [name for name in sys.modules.keys() if name == 'mcd_task' or name.startswith('mcd_task.')]:
+        monkeypatch.delitem(sys.modules, name)
+    global_variables = importlib.import_module('mcd_task.global_variables')
+    config = importlib.import_module('mcd_task.config')
+    variables = global_variables.GlobalVariables
+    variables.logger, variables.server = Logger(), Server()
+    variables.set_config(config.Config.get_default())
+    # Switch threads as often as possible to make races show up
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    yield importlib.import_module('mcd_task')
+    sys.setswitchinterval(switch_interval)
+
+
+def test_mixed_commands_keep_invariants(plugin):
+    variables, actions = plugin.GlobalVariables, plugin.command_actions
+    TaskManager, TitleList = plugin.TaskManager, plugin.TitleList
+    manager = TaskManager.load()
+    variables.setup_task_manager(manager)
+    for i in range(TOP_TASKS):
+        for j in range(SUB_TASKS):
+            manager.add_task(TitleList(f't{i}.s{j}'))
+    persistence = plugin.PersistenceWorker(0.01)
+    variables.setup_persistence(persistence)
+    persistence.start()
+    scheduler = plugin.DeadlineScheduler()
+    variables.setup_scheduler(scheduler)
+    scheduler.start()
+    errors = []
+
+    def writer(seed: int):
+        rand, source = random.Random(seed), Source()
+        for _ in range(WRITER_OPERATIONS):
+            title = f't{rand.randrange(TOP_TASKS)}.s{rand.randrange(SUB_TASKS + 2)}'
+            task = manager.find(TitleList(title))
+            try:
+                op = rand.randrange(7)
+                if op == 0 and task is None:
+                    actions.add_task(source, title)
+                elif op == 6:
+                    actions.batch_tasks(source, [f'add {title}.x', f'res {title}.x {PLAYERS[0]}', f'rm {title}'])
+                elif task is not None:
+                    if op == 1:
+                        actions.remove_task(source, task)
+                    elif op == 2:
+                        actions.set_responsible(source, task, rand.choice(PLAYERS))
+                    elif op == 3:
+                        actions.set_task_deadline(source, task, rand.uniform(-1, 1))
+                    elif op == 4:
+                        actions.set_done(source, task)
+                    elif op == 5:
+                        actions.set_task_priority(source, task, rand.randrange(5))
+            except plugin.TaskNotFound:
+                # Deleted by another thread after it was found
+                pass
+            except Exception as exc:
+                errors.append(repr(exc))
+
+    def reader(seed: int):
+        rand, source = random.Random(seed), Source()
+        for _ in range(READER_OPERATIONS):
+            try:
+                op = rand.randrange(4)
+                if op == 0:
+                    actions.all_tasks_detail(source, rand.randrange(1, 5))
+                elif op == 1:
+                    actions.info_player(source, rand.choice(PLAYERS))
+                elif op == 2:
+                    actions.list_task(source, rand.randrange(1, 3))
+                    manager.seek_for_item_with_priority(5)
+                else:
+                    task = manager.find(TitleList(f't{rand.randrange(TOP_TASKS)}'))
+                    if task is not None:
+                        actions.info_task(source, task)
+            except plugin.TaskNotFound:
+                pass
+            except Exception as exc:
+                errors.append(repr(exc))
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(WRITERS)]
+    threads += [threading.Thread(target=reader, args=(seed,)) for seed in range(WRITERS, WRITERS + READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    scheduler.stop()
+    persistence.stop()
+    assert errors == []
+
+    def walk(node):
+        for child in node.sub_tasks:
+            yield child
+            yield from walk(child)
+    tasks = list(walk(manager))
+    task_ids = {task.id for task in tasks}
+    assert {task.full_path() for task in tasks} == set(manager._path_index.keys())
+    assert task_ids == set(manager._id_index.keys())
+    assert {task.id for task in manager.deadline_index.iter_tasks()} == {
+        task.id for task in tasks if task.deadline != 0 and not task.is_done
+    }
+    responsibles = manager.responsible_manager
+    for player, work in responsibles.player_work.items():
+        assert work <= task_ids
+        assert all(player in responsibles.task_players[task_id] for task_id in work)
+
+    # Nothing is lost on the way to the storage
+    reloaded = TaskManager.load()
+    assert reloaded.serialize()['sub_tasks'] == manager.serialize()['sub_tasks']
+    assert reloaded.responsible_manager.player_work == responsibles.player_work